@@ -0,0 +1,112 @@
+# answer_cache.py
+import re
+import time
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from langchain_core.embeddings import Embeddings
+from index_manifest import get_index_manifest
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercases a question and collapses whitespace and trailing punctuation,
+    so trivially different phrasings hit the exact-match path.
+    """
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!. ").lower()
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    vector: np.ndarray
+    answer: str
+    created: float
+
+
+class AnswerCache:
+    """
+    In-memory answer cache for rag_answer. Matches exact (normalized) questions first and then
+    near-duplicates whose query embedding has cosine similarity >= `threshold`.
+    Entries expire after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and everything is dropped when the index version changes.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # normalized query -> CachedAnswer
+        self._index_version = None
+        self._lock = threading.Lock()
+
+    def _embed(self, query: str, vector=None) -> np.ndarray:
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def _sync_with_index(self) -> None:
+        # Any ingestion or delete_vector_db since the last call makes every answer stale
+        version = get_index_manifest().version()
+        if version != self._index_version:
+            if self._entries:
+                logging.info("Index changed; clearing answer cache.")
+            self._entries.clear()
+            self._index_version = version
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for key in [k for k, entry in self._entries.items() if entry.created < cutoff]:
+            del self._entries[key]
+
+    def get(self, query: str, vector=None) -> str:
+        """
+        Returns the cached answer for query or a near-duplicate of it, or None.
+        Pass the query's embedding as `vector` if the caller already has it.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._sync_with_index()
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is None and self._entries:
+                vector = self._embed(query, vector)
+                keys = list(self._entries.keys())
+                similarities = np.vstack([self._entries[k].vector for k in keys]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    logging.info(f"Near-duplicate of cached question '{keys[best]}' ({similarities[best]:.3f}).")
+                    key, entry = keys[best], self._entries[keys[best]]
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.answer
+
+    def put(self, query: str, answer: str, vector=None) -> None:
+        key = normalize_query(query)
+        vector = self._embed(query, vector)
+        with self._lock:
+            self._sync_with_index()
+            self._entries[key] = CachedAnswer(query, vector, answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
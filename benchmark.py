@@ -0,0 +1,249 @@
+# benchmark.py
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from mock_services import build_fixture_site, serve_fixture_site, serve_mock_llamaparse, serve_mock_groq
+
+# Offline benchmark of the ingestion and answer pipeline. A generated fixture site, mock LlamaParse
+# and Groq servers and the local vector backend stand in for every external service, so results
+# depend only on the code and the machine. Each corpus size runs in a fresh process and working
+# directory, so caches, indexes and peak RSS never carry over between sizes.
+#
+# Usage: python benchmark.py --sizes 5 20 50 --out report.json [--compare baseline.json]
+
+def stage_stats(latencies: list[float], failures: int = 0, **extra) -> dict:
+    """
+    Summarizes per-item latencies (seconds) of one stage.
+    Returns items, total seconds, throughput per second, p50/p95/max in milliseconds and any extra fields.
+    """
+    total = float(sum(latencies))
+    return {
+        "items": len(latencies),
+        "failures": failures,
+        "seconds": round(total, 4),
+        "throughput_per_s": round(len(latencies) / total, 3) if total else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        **extra,
+    }
+
+
+def _timed(items: list, func) -> tuple[list, list[float]]:
+    results, latencies = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(func(item))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def _fetch_without_browser(url: str) -> tuple[str, str]:
+    # Plain HTTP stand-in for the Selenium navigation, for machines without Chrome
+    from downloader import get_session
+
+    response = get_session().get(url, timeout=30)
+    response.raise_for_status()
+    return response.text, response.url
+
+
+def run_corpus(urls: list[str], topics: list[str], queries: int, use_browser: bool) -> dict:
+    """
+    Runs every stage over one corpus inside the current working directory and times each item.
+    Runs in a fresh process: the pipeline modules are imported here, after the environment is set.
+    Returns {"pages", "stages", "embedding_model_load_s", "peak_rss_mb"}.
+    """
+    import scraper
+    from ingest import assets_source, parse_pdf_parts
+    from document_processor import load_and_process_document
+    from rag import rag_answer, ERROR_ANSWER, NO_CONTEXT_ANSWER
+    from vector_store_setup import get_embeddings
+    from pdf_extractor import peak_rss_mb
+
+    if not use_browser:
+        scraper.navigate_to_url = _fetch_without_browser
+    embeddings = get_embeddings()
+    embeddings.load()  # Model load is reported separately, not charged to the first indexed page
+    stages = {}
+
+    dirs, latencies = _timed(urls, scraper.scrape_page)
+    stages["scrape_page"] = stage_stats(latencies, failures=dirs.count(None))
+    pages = [(url, dir_name) for url, dir_name in zip(urls, dirs) if dir_name]
+
+    # Same path as the parse stage of the job queue: size-capped parts, parsed concurrently
+    def combine(page):
+        dir_name = page[1]
+        return scraper.combine_text_images_pdf_parts(
+            dir_name, os.path.join(dir_name, f"{scraper.COMBINED_PDF_PREFIX}.pdf"), include_text=False
+        )
+
+    page_parts, latencies = _timed(pages, combine)
+    pdf_bytes = sum(os.path.getsize(path) for parts in page_parts for path in parts)
+    stages["combine_text_images_pdf_parts"] = stage_stats(latencies, output_mb=round(pdf_bytes / 1e6, 2))
+
+    # Pages without assets produce no PDF and are not sent to LlamaParse
+    with_pdf = [(page, parts) for page, parts in zip(pages, page_parts) if parts]
+
+    def parse(item):
+        (_, dir_name), parts = item
+        return parse_pdf_parts(parts, os.path.join(dir_name, f"{scraper.COMBINED_PDF_PREFIX}.md"))
+
+    parsed, latencies = _timed(with_pdf, parse)
+    stages["llamaparse"] = stage_stats(latencies, failures=parsed.count(None))
+
+    documents = [(os.path.join(dir_name, scraper.PAGE_MARKDOWN_FILE), url) for url, dir_name in pages]
+    documents += [(md_file, assets_source(url)) for ((url, _), _), md_file in zip(with_pdf, parsed) if md_file]
+    markdown_bytes = sum(os.path.getsize(path) for path, _ in documents if os.path.exists(path))
+    results, latencies = _timed(documents, lambda doc: load_and_process_document(doc[0], source_url=doc[1]))
+    stages["load_and_process_document"] = stage_stats(
+        latencies,
+        failures=sum(not success for success, _ in results),
+        input_mb=round(markdown_bytes / 1e6, 2),
+        mb_per_s=round(markdown_bytes / 1e6 / sum(latencies), 3) if latencies and sum(latencies) else None,
+    )
+
+    questions = [f"What does the page say about {topic}?" for topic in topics[:queries]]
+    answers, latencies = _timed(questions, rag_answer)
+    stages["rag_answer"] = stage_stats(
+        latencies, failures=sum(answer in (ERROR_ANSWER, NO_CONTEXT_ANSWER) for answer in answers)
+    )
+
+    rss = peak_rss_mb()
+    return {
+        "pages": len(urls),
+        "stages": stages,
+        "embedding_model_load_s": round(embeddings.load_seconds or 0.0, 3),
+        "peak_rss_mb": round(rss, 1) if rss is not None else None,
+    }
+
+
+def _run_in_directory(workdir: str, *args) -> dict:
+    os.chdir(workdir)  # Relative cache, index and scrape paths all land in this run's directory
+    return run_corpus(*args)
+
+
+def _git_commit() -> str:
+    try:
+        repo = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes: list[int], queries: int = 10, use_browser: bool = True, parse_seconds: float = 0.2,
+                  llm_tokens_per_second: float = 0, seed: int = 0, keep: bool = False) -> dict:
+    """
+    Starts the fixture site and mock services, then benchmarks each corpus size in its own process.
+    Returns the report: environment, settings and one entry per size with per-stage statistics.
+    """
+    root = tempfile.mkdtemp(prefix="bench-site-")
+    site = build_fixture_site(os.path.join(root, "site"), max(sizes), seed=seed)
+    site_server, site_url = serve_fixture_site(os.path.join(root, "site"))
+    parse_server, parse_url = serve_mock_llamaparse(processing_seconds=parse_seconds)
+    groq_server, groq_url = serve_mock_groq(tokens_per_second=llm_tokens_per_second)
+
+    # Inherited by the spawned run processes; paths are relative to each run's directory
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "LLAMA_API_KEY": "benchmark",
+        "GROQ_API_KEY": "benchmark",
+        "LLAMA_PARSE_BASE_URL": parse_url,
+        "GROQ_BASE_URL": groq_url,
+        "LLAMA_PARSE_POLL_INITIAL": "0.05",
+        "LLAMA_PARSE_POLL_MAX": "0.5",
+        "PDF_EXTRACTION_MODE": "llamaparse",  # Route PDFs through combine_text_images_pdf_parts and the mock
+        "SCRAPE_CACHE_ENABLED": "false",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        "METRICS_PORT": "0",
+    })
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "queries": queries, "use_browser": use_browser, "parse_seconds": parse_seconds,
+            "llm_tokens_per_second": llm_tokens_per_second, "seed": seed,
+        },
+        "runs": [],
+    }
+    try:
+        for size in sizes:
+            urls = [site_url + page["path"] for page in site[:size]]
+            topics = [page["topic"] for page in site[:size]]
+            workdir = tempfile.mkdtemp(prefix=f"bench-{size}-", dir=root)
+            logging.info(f"Benchmarking {size} pages in {workdir}")
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                run = pool.submit(_run_in_directory, workdir, urls, topics, queries, use_browser).result()
+            report["runs"].append(run)
+            logging.info(f"{size} pages: " + ", ".join(
+                f"{stage} {stats['throughput_per_s']}/s p95 {stats['p95_ms']} ms" for stage, stats in run["stages"].items()
+            ) + f", peak RSS {run['peak_rss_mb']} MB")
+    finally:
+        for server in (site_server, parse_server, groq_server):
+            server.shutdown()
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    """
+    Lines comparing throughput, p95 latency and peak RSS per size and stage against a baseline report.
+    Ratios above 1 mean faster (throughput) or slower and larger (p95, RSS) than the baseline.
+    """
+    lines = [f"Baseline {baseline.get('commit') or '?'} -> current {report.get('commit') or '?'}"]
+    baseline_runs = {run["pages"]: run for run in baseline.get("runs", [])}
+
+    def ratio(new, old):
+        return f"{new / old:.2f}x" if new and old else "n/a"
+
+    for run in report["runs"]:
+        old = baseline_runs.get(run["pages"])
+        if not old:
+            continue
+        lines.append(f"{run['pages']} pages: peak RSS {ratio(run['peak_rss_mb'], old['peak_rss_mb'])}")
+        for stage, stats in run["stages"].items():
+            before = old["stages"].get(stage, {})
+            lines.append(
+                f"  {stage}: throughput {ratio(stats['throughput_per_s'], before.get('throughput_per_s'))}, "
+                f"p95 {ratio(stats['p95_ms'], before.get('p95_ms'))}"
+            )
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against local stand-in services.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50], help="Corpus sizes in pages")
+    parser.add_argument("--queries", type=int, default=10, help="Questions answered per corpus")
+    parser.add_argument("--out", default="benchmark_report.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    parser.add_argument("--no-browser", action="store_true", help="Fetch pages over plain HTTP instead of Chrome")
+    parser.add_argument("--parse-seconds", type=float, default=0.2, help="Mock LlamaParse processing time per job")
+    parser.add_argument("--llm-tps", type=float, default=0, help="Mock LLM tokens per second (0 = instant)")
+    parser.add_argument("--seed", type=int, default=0, help="Fixture site seed")
+    parser.add_argument("--keep", action="store_true", help="Keep the fixture site and run directories")
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        sorted(set(args.sizes)), queries=args.queries, use_browser=not args.no_browser,
+        parse_seconds=args.parse_seconds, llm_tokens_per_second=args.llm_tps, seed=args.seed, keep=args.keep,
+    )
+    with open(args.out, "w", encoding="utf-8") as file:
+        json.dump(result, file, indent=2)
+    print(f"Report written to {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            print("\n".join(compare(result, json.load(file))))
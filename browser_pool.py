@@ -0,0 +1,193 @@
+# browser_pool.py
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+from config import (
+    BROWSER_POOL_SIZE,
+    BROWSER_MAX_PAGES,
+    PAGE_LOAD_TIMEOUT,
+    NETWORK_IDLE_TIME,
+    PAGE_LOAD_FALLBACK_SLEEP,
+)
+
+# Document readiness and the number of resources the page has requested so far (Resource Timing API)
+_READY_STATE_JS = "return [document.readyState, window.performance.getEntriesByType('resource').length];"
+
+
+@lru_cache(maxsize=1)
+def _chromedriver_path() -> str:
+    """
+    Resolves the chromedriver binary once per process instead of once per page.
+    """
+    return ChromeDriverManager().install()
+
+
+def _create_driver() -> webdriver.Chrome:
+    """
+    Starts a new headless Chrome instance.
+    """
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    # Return from driver.get() at DOMContentLoaded; wait_for_page_ready() handles the rest
+    options.page_load_strategy = "eager"
+    driver = webdriver.Chrome(service=Service(_chromedriver_path()), options=options)
+    driver.set_page_load_timeout(max(PAGE_LOAD_TIMEOUT * 2, 30))
+    return driver
+
+
+def _quit_driver(driver) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def is_driver_healthy(driver) -> bool:
+    """
+    Returns True if the browser session still responds to commands.
+    """
+    try:
+        driver.execute_script("return 1;")
+        return bool(driver.window_handles)
+    except Exception:
+        return False
+
+
+def wait_for_page_ready(driver, timeout: float = PAGE_LOAD_TIMEOUT, idle_time: float = NETWORK_IDLE_TIME) -> bool:
+    """
+    Waits until the page is ready: the load event has fired (readyState "complete") or the network
+    has gone idle (no new resources requested for `idle_time` seconds), whichever comes first.
+    Both are checked on every poll, so a page that keeps a long-poll or beacon open is ready once it
+    has loaded, and a page whose load event is held up by a slow resource is ready once requests stop.
+    Gives up after `timeout` seconds; falls back to a fixed sleep if readiness cannot be detected at all.
+    Returns True if the page was ready before the timeout, otherwise False.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        last_count, idle_since = None, time.monotonic()
+        while True:
+            state, count = driver.execute_script(_READY_STATE_JS)
+            now = time.monotonic()
+            if state == "complete":
+                return True
+            if count != last_count:
+                last_count, idle_since = count, now
+            elif now - idle_since >= idle_time:
+                return True
+            if now >= deadline:
+                logging.info("Timed out waiting for the page to load or the network to go idle.")
+                return False
+            time.sleep(0.1)
+    except Exception as e:
+        logging.warning(f"Could not detect page readiness ({e}); falling back to fixed wait.")
+        time.sleep(PAGE_LOAD_FALLBACK_SLEEP)
+        return False
+
+
+class BrowserPool:
+    """
+    A bounded pool of long-lived headless Chrome drivers, safe to share between threads.
+    Drivers are health-checked before reuse and recycled after `max_pages` pages.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()  # Entries are [driver, pages_served]
+        self._live = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _discard(self, driver) -> None:
+        with self._lock:
+            self._live.discard(driver)
+        _quit_driver(driver)
+
+    def _checkout(self) -> list:
+        # Reuse the most recently returned healthy driver, otherwise start a new one
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if is_driver_healthy(entry[0]):
+                return entry
+            logging.info("Discarding unhealthy browser session.")
+            self._discard(entry[0])
+
+        driver = _create_driver()
+        with self._lock:
+            self._live.add(driver)
+        logging.info(f"Started new browser session ({len(self._live)}/{self.size}).")
+        return [driver, 0]
+
+    @contextmanager
+    def driver(self, timeout: float = None):
+        """
+        Context manager that lends a driver from the pool, blocking while all drivers are busy.
+        A driver that raised an error while borrowed is discarded rather than reused.
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool is closed.")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("Timed out waiting for a free browser session.")
+        entry = None
+        try:
+            entry = self._checkout()
+            yield entry[0]
+        except Exception:
+            if entry:
+                self._discard(entry[0])
+                entry = None
+            raise
+        finally:
+            if entry:
+                entry[1] += 1
+                if self._closed or entry[1] >= self.max_pages:
+                    logging.info(f"Recycling browser session after {entry[1]} pages.")
+                    self._discard(entry[0])
+                else:
+                    try:
+                        entry[0].delete_all_cookies()
+                        self._idle.put(entry)
+                    except Exception:
+                        self._discard(entry[0])
+            self._slots.release()
+
+    def close(self) -> None:
+        """
+        Quits every driver owned by the pool.
+        """
+        self._closed = True
+        with self._lock:
+            drivers = list(self._live)
+            self._live.clear()
+        for driver in drivers:
+            _quit_driver(driver)
+        logging.info("Browser pool closed.")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Returns the process-wide browser pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,249 @@
+# chunker.py
+import re
+import hashlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+import numpy as np
+from langchain_core.documents import Document
+from config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, SIMHASH_MAX_DISTANCE
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Approximates the model token count by counting words and punctuation marks.
+    """
+    return len(TOKEN.findall(text))
+
+
+@dataclass
+class ChunkStats:
+    source_bytes: int = 0
+    chunks: int = 0
+    chunk_bytes: int = 0
+    duplicates: int = 0
+    duplicate_bytes: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks} chunks ({self.chunk_bytes} bytes from {self.source_bytes} source bytes), "
+            f"{self.duplicates} near-duplicates dropped ({self.duplicate_bytes} bytes saved)"
+        )
+
+
+def _blocks(docs: Iterable[Document]) -> Iterator[tuple[dict, list[str], str, str]]:
+    """
+    Parses streamed Markdown into (doc_metadata, heading_path, content_type, text) blocks.
+    Headings update the path; fenced code, tables, lists and paragraphs become blocks. A heading
+    with neither content nor subheadings yields an empty "heading" block, so its section survives.
+    State carries across documents, so a source split into several Documents parses as one.
+    """
+    headings = []
+    lines, kind, metadata = [], None, {}
+    in_code = False
+    empty_section = False  # The last heading has no content yet
+
+    def flush():
+        nonlocal lines, kind, empty_section
+        text = "\n".join(lines).strip("\n")
+        block = (metadata, [h for _, h in headings], kind, text) if text.strip() else None
+        lines, kind = [], None
+        empty_section = empty_section and block is None
+        return block
+
+    for doc in docs:
+        for line in doc.page_content.splitlines():
+            if in_code:
+                lines.append(line)
+                if line.strip().startswith("```"):
+                    in_code = False
+                    if block := flush():
+                        yield block
+                continue
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                if block := flush():
+                    yield block
+                lines, kind, metadata, in_code = [line], "code", doc.metadata, True
+                continue
+            heading = HEADING.match(stripped)
+            if heading:
+                if block := flush():
+                    yield block
+                level = len(heading.group(1))
+                if empty_section and level <= headings[-1][0]:
+                    yield metadata, [h for _, h in headings], "heading", ""
+                headings = [(lvl, text) for lvl, text in headings if lvl < level] + [(level, heading.group(2))]
+                metadata, empty_section = doc.metadata, True
+                continue
+            if not stripped:
+                if kind != "list" and (block := flush()):  # Lists may contain blank lines between items
+                    yield block
+                continue
+            line_kind = "table" if stripped.startswith("|") else "list" if LIST_ITEM.match(line) else "text"
+            if kind == "list" and line_kind == "text" and line[:1].isspace():
+                line_kind = "list"  # Continuation of a list item
+            if kind and line_kind != kind:
+                if block := flush():
+                    yield block
+            if not lines:
+                metadata = doc.metadata
+            kind = line_kind
+            lines.append(line)
+    if block := flush():
+        yield block
+    elif empty_section:
+        yield metadata, [h for _, h in headings], "heading", ""
+
+
+def _split_block(text: str, kind: str, max_tokens: int, overlap_tokens: int) -> list[str]:
+    """
+    Splits a block that exceeds max_tokens: tables and code by line (tables repeat their header),
+    prose by sentence. Consecutive pieces share at most `overlap_tokens` of trailing context.
+    """
+    if kind in ("table", "code", "list"):
+        units = text.split("\n")
+        header = units[:2] if kind == "table" and len(units) > 2 else []
+        units = units[len(header):]
+        joiner = "\n"
+    else:
+        units = SENTENCE_END.split(text)
+        header = []
+        joiner = " "
+    # Units longer than the budget (e.g. one huge sentence) are cut by words
+    pieces = []
+    for unit in units:
+        words = unit.split(" ")
+        while count_tokens(unit) > max_tokens and len(words) > 1:
+            take = max(1, len(words) * max_tokens // count_tokens(unit))
+            pieces.append(" ".join(words[:take]))
+            words = words[take:]
+            unit = " ".join(words)
+        pieces.append(unit)
+
+    header_tokens = count_tokens("\n".join(header))
+    chunks, current, size = [], [], header_tokens
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and size + tokens > max_tokens:
+            chunks.append(joiner.join(header + current))
+            # Carry trailing units as overlap, but never more than overlap_tokens
+            carry, carried = [], 0
+            for unit in reversed(current):
+                unit_tokens = count_tokens(unit)
+                if carried + unit_tokens > overlap_tokens:
+                    break
+                carry.insert(0, unit)
+                carried += unit_tokens
+            current, size = carry, header_tokens + carried
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append(joiner.join(header + current))
+    return chunks
+
+
+def chunk_markdown(docs: Iterable[Document], source: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   overlap_tokens: int = CHUNK_OVERLAP_TOKENS, stats: ChunkStats = None) -> Iterator[Document]:
+    """
+    Splits streamed Markdown into token-bounded chunks that never cross a heading. Small blocks of one
+    section are packed together; only blocks larger than the budget are split, with at most
+    `overlap_tokens` of overlap. Each chunk's text starts with its heading path (e.g. "Admissions > Fees"),
+    so it is embedded and keyword-searched with its section title, and its metadata carries its source,
+    heading path and content type ("text", "list", "table", "code", "heading" or "mixed") on top of the
+    originating document's metadata.
+    """
+    stats = stats if stats is not None else ChunkStats()
+    current, kinds, size, path, metadata = [], set(), 0, None, {}
+    title, budget = "", max_tokens
+
+    def emit():
+        nonlocal current, kinds, size
+        chunk = None
+        text = "\n\n".join(part for part in [title] + current if part) if current else ""
+        if text:
+            chunk = Document(
+                page_content=text,
+                metadata={
+                    **metadata,
+                    "source": source,
+                    "heading_path": " > ".join(path),
+                    "content_type": kinds.pop() if len(kinds) == 1 else "mixed",
+                },
+            )
+            stats.chunks += 1
+            stats.chunk_bytes += len(text.encode("utf-8"))
+        current, kinds, size = [], set(), 0
+        return chunk
+
+    for doc_metadata, heading_path, kind, text in _blocks(docs):
+        stats.source_bytes += len(text.encode("utf-8"))
+        tokens = count_tokens(text)
+        if heading_path != path or (current and size + tokens > budget):
+            if chunk := emit():
+                yield chunk
+            if heading_path != path:
+                path, title = heading_path, " > ".join(heading_path)
+                budget = max(max_tokens // 2, max_tokens - count_tokens(title))  # The title counts too
+        if not current:
+            metadata = doc_metadata
+        if tokens > budget:
+            for piece in _split_block(text, kind, budget, overlap_tokens):
+                current, kinds, size = [piece], {kind}, count_tokens(piece)
+                if chunk := emit():
+                    yield chunk
+            continue
+        current.append(text)
+        kinds.add(kind)
+        size += tokens
+    if chunk := emit():
+        yield chunk
+
+
+def simhash(text: str) -> int:
+    """
+    Returns a 64-bit SimHash of the text's word 3-shingles. Near-identical texts
+    (e.g. the same footer with a different date) differ in only a few bits.
+    """
+    words = TOKEN.findall(text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class NearDuplicateFilter:
+    """
+    Flags chunks whose SimHash is within `max_distance` bits of a chunk already indexed for another
+    source (via the manifest) or already seen in this run. Candidates are found by exact match on
+    one of four 16-bit bands, which is guaranteed to catch every pair within 3 bits.
+    """
+
+    def __init__(self, manifest, source: str, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.manifest = manifest
+        self.source = source
+        self.max_distance = max_distance
+        self._bands = {}  # (band number, band value) -> hashes seen in this run
+
+    def is_duplicate(self, value: int) -> bool:
+        bands = [(n, (value >> (16 * n)) & 0xFFFF) for n in range(4)]
+        for band in bands:
+            if any(hamming_distance(value, other) <= self.max_distance for other in self._bands.get(band, ())):
+                return True
+        if self.manifest.has_near_duplicate(value, self.source, self.max_distance):
+            return True
+        for band in bands:
+            self._bands.setdefault(band, []).append(value)
+        return False
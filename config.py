@@ -1,7 +1,6 @@
 import os
 import logging
 import dotenv
-import streamlit as st
 
 # Setup logging
 logging.basicConfig(
@@ -13,11 +12,143 @@ logging.basicConfig(
 dotenv.load_dotenv()
 LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # Point at a mock server for tests (default: Groq's API)
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")  # Pinecone API Key
 INDEX_NAME = "testing"  # Pinecone Index Name
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")  # "pinecone" or "local" (in-process, offline)
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".index/local")  # Persisted local vector index
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST")  # Index data-plane URL, e.g. a local stand-in (default: looked up)
+PINECONE_NAMESPACE_MODE = os.getenv("PINECONE_NAMESPACE_MODE", "single")  # "single" or "site" (one namespace per site)
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "none")  # "none", "int8" or "binary" codes in RAM
+LOCAL_INDEX_RESCORE_FACTOR = int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "4"))  # Candidates per result rescored in float32
 
-# Check for missing API keys
-if not (LLAMA_API_KEY and GROQ_API_KEY and PINECONE_API_KEY):
-    logging.error("One or more required API keys are missing.")
-    st.error("Missing API keys. Please check your environment configuration.")
-    st.stop()
+# Headless browser pool
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))  # Max concurrent Chrome instances
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))  # Recycle a driver after this many pages
+PAGE_LOAD_TIMEOUT = float(os.getenv("PAGE_LOAD_TIMEOUT", "15"))  # Seconds to wait for a page to settle
+NETWORK_IDLE_TIME = float(os.getenv("NETWORK_IDLE_TIME", "0.5"))  # Seconds without new requests = idle
+PAGE_LOAD_FALLBACK_SLEEP = 3  # Fixed wait used only when readiness cannot be detected
+
+# Crawl scheduling
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))  # Concurrent requests per host
+CRAWL_PER_HOST_DELAY = float(os.getenv("CRAWL_PER_HOST_DELAY", "1.0"))  # Seconds between requests to one host
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "1"))  # Link hops from the seed URLs when following links
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "50"))  # Page budget when following links
+
+# Background ingestion jobs
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", ".index/jobs.db")
+JOB_WORKERS = {  # Worker processes per stage
+    "crawl": int(os.getenv("JOB_WORKERS_CRAWL", "2")),
+    "parse": int(os.getenv("JOB_WORKERS_PARSE", "2")),
+    "index": int(os.getenv("JOB_WORKERS_INDEX", "1")),
+}
+JOB_QUEUE_AUTOSTART = os.getenv("JOB_QUEUE_AUTOSTART", "true").lower() == "true"  # Start workers with the UI
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # Tries per task before it is marked failed
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # Seconds before the first retry, doubled after
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "1800"))  # A task running longer is assumed orphaned
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # Idle worker poll interval, in seconds
+JOB_SHUTDOWN_TIMEOUT = float(os.getenv("JOB_SHUTDOWN_TIMEOUT", "30"))  # Seconds workers get to finish their task on exit
+
+# Asset downloads
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))  # Parallel downloads / pooled connections
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))  # Retries for connection errors, 429 and 5xx
+DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", "0.5"))  # Base backoff in seconds, doubled per retry
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # Per-file size cap
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))  # Seconds per request
+
+# Scrape cache (kept outside the per-page directories that are deleted after ingestion)
+SCRAPE_CACHE_ENABLED = os.getenv("SCRAPE_CACHE_ENABLED", "true").lower() == "true"
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", ".scrape_cache")
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # LRU eviction above this
+
+# Local record of the chunk IDs each source has in the vector store
+INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", ".index/manifest.db")
+
+# Indexing pipeline
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "100"))  # Chunks embedded and upserted per batch
+INDEX_READ_BLOCK_CHARS = int(os.getenv("INDEX_READ_BLOCK_CHARS", "20000"))  # Markdown read and split per block
+
+# Index writes (Pinecone REST upserts and deletes)
+INDEX_WRITE_BATCH_BYTES = int(os.getenv("INDEX_WRITE_BATCH_BYTES", str(1900 * 1000)))  # Under Pinecone's 2 MB request cap
+INDEX_WRITE_BATCH_VECTORS = int(os.getenv("INDEX_WRITE_BATCH_VECTORS", "1000"))  # And at 1000 vectors
+INDEX_WRITE_CONCURRENCY = int(os.getenv("INDEX_WRITE_CONCURRENCY", "4"))  # Requests in flight / pooled connections
+INDEX_WRITE_RETRIES = int(os.getenv("INDEX_WRITE_RETRIES", "5"))  # Retries for 429, 5xx and connection errors
+INDEX_WRITE_BACKOFF = float(os.getenv("INDEX_WRITE_BACKOFF", "0.5"))  # Base backoff in seconds, doubled per retry
+
+# Chunking
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))  # Approximate (word + punctuation) tokens per chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))  # Only between pieces of one oversized block
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "true").lower() == "true"  # Drop near-duplicate chunks
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))  # Max differing bits for a near-duplicate
+CHUNK_DEDUP_MAX_TOKENS = int(os.getenv("CHUNK_DEDUP_MAX_TOKENS", "64"))  # Only chunks this short (banners, notices) are deduplicated
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")  # e.g. a quantized int8 export
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))  # >1 fans large batches out to CPU processes
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".index/embeddings.db")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# LlamaParse client
+LLAMA_PARSE_BASE_URL = os.getenv("LLAMA_PARSE_BASE_URL", "https://api.cloud.llamaindex.ai/api/parsing")  # Point at a mock server for tests
+LLAMA_PARSE_CONCURRENCY = int(os.getenv("LLAMA_PARSE_CONCURRENCY", "4"))  # Jobs in flight at once
+LLAMA_PARSE_TIMEOUT = float(os.getenv("LLAMA_PARSE_TIMEOUT", "900"))  # Overall deadline per job, in seconds
+LLAMA_PARSE_RETRIES = int(os.getenv("LLAMA_PARSE_RETRIES", "3"))  # Retries for transport errors, 429 and 5xx
+LLAMA_PARSE_POLL_INITIAL = float(os.getenv("LLAMA_PARSE_POLL_INITIAL", "1.0"))  # First status poll delay
+LLAMA_PARSE_POLL_MAX = float(os.getenv("LLAMA_PARSE_POLL_MAX", "15.0"))  # Poll delay cap
+
+# PDF text extraction
+PDF_EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "local")  # "local" (pdfplumber) or "llamaparse"
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # Worker processes per PDF
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))  # Pages handed to a worker at a time
+PDF_LLAMAPARSE_FALLBACK = os.getenv("PDF_LLAMAPARSE_FALLBACK", "true").lower() == "true"  # OCR pages without text
+
+# Asset PDF assembly (images and PDFs combined for LlamaParse)
+PDF_IMAGE_DPI = int(os.getenv("PDF_IMAGE_DPI", "150"))  # Images downsampled to this resolution (0 = keep size)
+PDF_IMAGE_QUALITY = int(os.getenv("PDF_IMAGE_QUALITY", "80"))  # JPEG quality of recompressed images
+PDF_ASSEMBLY_WORKERS = int(os.getenv("PDF_ASSEMBLY_WORKERS", "4"))  # Threads converting images
+PDF_PART_MAX_BYTES = int(os.getenv("PDF_PART_MAX_BYTES", str(20 * 1024 * 1024)))  # Split output above this (0 = one file)
+
+# Retrieval
+RETRIEVAL_VECTOR_K = int(os.getenv("RETRIEVAL_VECTOR_K", "20"))  # Vector search candidates
+RETRIEVAL_KEYWORD_K = int(os.getenv("RETRIEVAL_KEYWORD_K", "20"))  # BM25 candidates (0 = vector only)
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))  # Reciprocal-rank fusion damping constant
+RETRIEVAL_MMR_ENABLED = os.getenv("RETRIEVAL_MMR_ENABLED", "false").lower() == "true"  # Diversify fused results
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))  # 1 = relevance only, 0 = diversity only
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "1500"))  # Prompt context budget
+RETRIEVAL_BATCH_WORKERS = int(os.getenv("RETRIEVAL_BATCH_WORKERS", "8"))  # Parallel searches in a batch
+
+# Batch answering (rag_answer_batch); 0 disables a limit
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "4"))  # LLM calls in flight at once
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))  # Match the account's Groq quota
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+RAG_ANSWER_TOKENS = int(os.getenv("RAG_ANSWER_TOKENS", "300"))  # Expected answer length, reserved per call
+RAG_MULTI_QUERY_COUNT = int(os.getenv("RAG_MULTI_QUERY_COUNT", "3"))  # Rephrasings per question when expanding
+
+# Semantic answer cache (cleared automatically whenever the index changes)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))  # Min cosine similarity for a hit
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))  # Seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Telemetry
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE", ".index/traces.jsonl")  # Spans from every process, one JSON object per line
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))  # Rotated to <file>.1 beyond this
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # Prometheus /metrics endpoint (0 = off)
+
+def missing_settings() -> list[str]:
+    """
+    Returns the names of required API keys that are not configured (empty when all are set).
+    The UI checks this at startup; importing config never exits or touches Streamlit.
+    """
+    required = {"LLAMA_API_KEY": LLAMA_API_KEY, "GROQ_API_KEY": GROQ_API_KEY}
+    if VECTOR_BACKEND != "local":
+        required["PINECONE_API_KEY"] = PINECONE_API_KEY
+    missing = [name for name, value in required.items() if not value]
+    if missing:
+        logging.error(f"Required API keys are missing: {', '.join(missing)}")
+    return missing
@@ -0,0 +1,36 @@
+# crawler.py
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# URL normalization shared by the job queue's crawl stage (deduplication and per-host limits)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a URL for deduplication: lowercases scheme and host, drops default ports,
+    fragments, duplicate and trailing slashes, and sorts query parameters.
+    Returns None for anything that is not an http(s) URL.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            return None
+        host = parts.hostname.lower()
+        port = parts.port
+    except ValueError:
+        return None
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_host(url: str) -> str:
+    """
+    Returns the host (with non-default port) of a normalized URL.
+    """
+    return urlsplit(url).netloc
@@ -1,30 +1,173 @@
 import logging
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from vector_store_setup import vector_store  # Pinecone vector store
+import contextvars
+from itertools import islice
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from vector_store_setup import get_embeddings, upsert_vectors, delete_vectors  # Pinecone vector store
+from index_writer import namespace_for
+from index_manifest import chunk_id, get_index_manifest
+from chunker import ChunkStats, NearDuplicateFilter, chunk_markdown, count_tokens, simhash
+from telemetry import span, traced, current_span
+from config import INDEX_BATCH_SIZE, INDEX_READ_BLOCK_CHARS, CHUNK_DEDUP_ENABLED, CHUNK_DEDUP_MAX_TOKENS, VECTOR_BACKEND
 
-def load_and_process_document(md_file: str) -> str:
+VECTOR_STORE_NAME = "Pinecone" if VECTOR_BACKEND == "pinecone" else "the local vector store"
+
+def iter_markdown_blocks(md_file: str, source: str, block_chars: int = INDEX_READ_BLOCK_CHARS) -> Iterator[Document]:
     """
-    Loads the structured Markdown, splits it into chunks, and indexes them in Pinecone.
-    Returns a success message or an error message.
+    Reads a Markdown file lazily and yields it as Documents of roughly `block_chars` characters,
+    cut at blank lines so paragraphs stay whole. Text without blank lines (one huge table,
+    LlamaParse output) is cut at a line end once a block reaches 4 * `block_chars`; lines longer
+    than `block_chars` are read in pieces. Memory does not grow with file size.
     """
-    try:
-        logging.info(f"Loading document: {md_file}")
-        loader = TextLoader(md_file, encoding="utf-8")
-        docs = loader.load()  # Load the document
-        logging.info(f"Document loaded successfully: {md_file}")
+    with open(md_file, "r", encoding="utf-8") as file:
+        block, size = [], 0
+        for line in iter(lambda: file.readline(block_chars), ""):
+            block.append(line)
+            size += len(line)
+            if size >= block_chars and not line.strip() or size >= 4 * block_chars:
+                yield Document(page_content="".join(block), metadata={"source": source})
+                block, size = [], 0
+        if "".join(block).strip():
+            yield Document(page_content="".join(block), metadata={"source": source})
+
+def iter_chunks(docs: Iterable[Document], source: str, stats: ChunkStats) -> Iterator[tuple[str, Document, int]]:
+    """
+    Splits documents into heading-aware chunks as they arrive and yields (stable_id, chunk, simhash).
+    Identical chunks within the source are yielded once; short chunks (up to CHUNK_DEDUP_MAX_TOKENS,
+    e.g. repeated banners and notices) that nearly duplicate one already indexed for another source are
+    dropped before they are embedded. Longer content is always kept under its own source, so it stays
+    indexed when another source that shares it is removed or changes.
+    """
+    dedup = NearDuplicateFilter(get_index_manifest(), source) if CHUNK_DEDUP_ENABLED else None
+    seen = set()
+    for chunk in chunk_markdown(docs, source, stats=stats):
+        id_ = chunk_id(source, chunk.page_content)
+        if id_ in seen:
+            continue
+        seen.add(id_)
+        hash_ = simhash(chunk.page_content)
+        if dedup and count_tokens(chunk.page_content) <= CHUNK_DEDUP_MAX_TOKENS and dedup.is_duplicate(hash_):
+            stats.duplicates += 1
+            stats.duplicate_bytes += len(chunk.page_content.encode("utf-8"))
+            continue
+        yield id_, chunk, hash_
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+@traced("index.document")
+def index_documents(docs: Iterable[Document], source: str, batch_size: int = INDEX_BATCH_SIZE) -> tuple[bool, str]:
+    """
+    Streams documents through split -> embed -> upsert in batches of `batch_size` chunks under `source`.
+    Batch N+1 is embedded while batch N is upserted, and at most one upsert is in flight, so memory
+    stays bounded. Chunks get stable IDs derived from the source and their content and are recorded
+    in the index manifest as each batch lands: re-ingesting only upserts new chunks, deletes the ones
+    that disappeared, and an interrupted ingest resumes after the last completed batch.
+    Returns (success, message).
+    """
+    manifest = get_index_manifest()
+    indexed_ids = manifest.chunk_ids(source)
+    namespace = namespace_for(source)
+    seen_ids = set()
+    new_count = 0
+    changed = False
+    stats = ChunkStats()
+
+    def upsert(batch: list[tuple[str, Document, int]], vectors) -> None:
+        ids = [id_ for id_, _, _ in batch]
+        upsert_vectors([c.page_content for _, c, _ in batch], vectors, [c.metadata for _, c, _ in batch], ids, namespace)
+        # Checkpoint: these chunks survive an interruption
+        manifest.add(
+            source, ids,
+            simhashes={id_: hash_ for id_, _, hash_ in batch},
+            documents={id_: (c.page_content, c.metadata) for id_, c, _ in batch},
+        )
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=200)
-        chunks = text_splitter.split_documents(docs)  # Split document into chunks
-        total_chunks = len(chunks)
-        logging.info(f"Document split into {total_chunks} chunks.")
+    try:
+        with ThreadPoolExecutor(max_workers=1) as upserter:
+            pending = None
+            for batch in batched(iter_chunks(docs, source, stats), batch_size):
+                seen_ids.update(id_ for id_, _, _ in batch)
+                batch = [item for item in batch if item[0] not in indexed_ids]
+                if not batch:
+                    continue
+                with span("index.embed", chunks=len(batch)):
+                    vectors = get_embeddings().embed_array([chunk.page_content for _, chunk, _ in batch])
+                if pending:
+                    pending.result()  # Backpressure: wait for the previous upsert before queueing this one
+                changed = True
+                # Run in a copy of this context so the upsert span nests under this document's span
+                pending = upserter.submit(contextvars.copy_context().run, upsert, batch, vectors)
+                new_count += len(batch)
+            if pending:
+                pending.result()
+        logging.info(f"Chunked {source}: {stats.summary()}.")
 
-        # Insert chunks into Pinecone
-        vector_store.add_documents(chunks)
+        # Drop chunks no longer present (only after the whole source streamed through)
+        vanished_ids = list(indexed_ids - seen_ids)
+        if vanished_ids:
+            delete_vectors(vanished_ids, namespace)
+            manifest.remove(source, vanished_ids)
+            changed = True
 
-        logging.info("All chunks inserted successfully into Pinecone.")
-        return "Document processed and embeddings stored successfully in Pinecone!"
+        unchanged = len(seen_ids) - new_count
+        current_span().set(
+            chunks=len(seen_ids), new=new_count, removed=len(vanished_ids),
+            duplicates=stats.duplicates, duplicate_bytes=stats.duplicate_bytes,
+        )
+        logging.info(f"Indexed {source}: {new_count} new, {len(vanished_ids)} removed, {unchanged} unchanged chunks.")
+        return True, (
+            f"Document processed and embeddings stored in {VECTOR_STORE_NAME}. "
+            f"({new_count} new, {len(vanished_ids)} removed, {unchanged} unchanged chunks; "
+            f"{stats.duplicates} near-duplicates dropped, {stats.duplicate_bytes} bytes saved)"
+        )
     except Exception as e:
-        error_msg = f"Error processing document {md_file}: {e}"
+        error_msg = f"Error processing document {source}: {e}"
         logging.error(error_msg)
-        return error_msg
+        return False, error_msg
+    finally:
+        if changed:
+            manifest.bump_version()  # Invalidates cached answers
+
+def load_and_process_document(md_file: str, source_url: str = None) -> tuple[bool, str]:
+    """
+    Streams the structured Markdown from disk, splits it into chunks, and indexes them in the vector store.
+    Returns (success, message).
+    """
+    logging.info(f"Loading document: {md_file}")
+    return index_documents(iter_markdown_blocks(md_file, source_url or md_file), source_url or md_file)
+
+def remove_source(source: str) -> int:
+    """
+    Deletes every chunk indexed for a source (e.g. assets a page no longer links to).
+    Returns the number of chunks removed.
+    """
+    manifest = get_index_manifest()
+    ids = list(manifest.chunk_ids(source))
+    if ids:
+        delete_vectors(ids, namespace_for(source))
+        manifest.remove(source, ids)
+        manifest.bump_version()
+        logging.info(f"Removed {len(ids)} chunks of {source} from the index.")
+    return len(ids)
+
+def remove_site(namespace: str) -> int:
+    """
+    Deletes a whole site's namespace (PINECONE_NAMESPACE_MODE=site) in one request, then forgets its
+    sources. If the delete fails the manifest is untouched, so the site can be removed again.
+    Returns the number of chunks removed.
+    """
+    manifest = get_index_manifest()
+    delete_vectors(None, namespace)
+    removed = 0
+    for source in manifest.sources():
+        if namespace_for(source) == namespace:
+            ids = manifest.chunk_ids(source)
+            manifest.remove(source, ids)
+            removed += len(ids)
+    manifest.bump_version()
+    logging.info(f"Removed site namespace {namespace!r} ({removed} chunks) from the index.")
+    return removed
@@ -0,0 +1,201 @@
+# downloader.py
+import os
+import re
+import time
+import random
+import hashlib
+import logging
+import threading
+import requests
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from config import (
+    DOWNLOAD_CONCURRENCY,
+    DOWNLOAD_RETRIES,
+    DOWNLOAD_BACKOFF,
+    DOWNLOAD_MAX_BYTES,
+    DOWNLOAD_TIMEOUT,
+)
+from scrape_cache import get_scrape_cache, conditional_headers, validators
+
+IMAGE_TYPES = {"image/jpeg": ".jpg", "image/png": ".png"}
+PDF_TYPES = {"application/pdf": ".pdf"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Leading bytes that identify a file regardless of what the server claims
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"%PDF-", "application/pdf"),
+]
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session, whose connection pool keeps connections alive
+    across downloads and is sized for DOWNLOAD_CONCURRENCY parallel requests.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_CONCURRENCY, pool_maxsize=DOWNLOAD_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"User-Agent": "Mozilla/5.0"})
+            _session = session
+        return _session
+
+
+def sniff_content_type(head: bytes, declared: str = "") -> str:
+    """
+    Determines a file's MIME type from its first bytes, falling back to the declared Content-Type.
+    """
+    for magic, content_type in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return content_type
+    return (declared or "").split(";", 1)[0].strip().lower()
+
+
+def asset_filename(url: str, extension: str) -> str:
+    """
+    Builds a collision-safe file name from the URL's base name plus a short hash of the full URL,
+    so two different URLs ending in the same file name never overwrite each other.
+    """
+    stem = os.path.splitext(os.path.basename(urlparse(url).path))[0]
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", stem)[:60] or "file"
+    url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+    return f"{stem}_{url_hash}{extension}"
+
+
+def request_with_retries(url: str, headers: dict = None, retries: int = DOWNLOAD_RETRIES) -> requests.Response:
+    """
+    Issues a streaming GET through the pooled session, retrying connection errors and
+    throttled or 5xx responses with exponential backoff and jitter.
+    Returns the response (the caller must close it). Raises requests.RequestException on failure.
+    """
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, stream=True, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            response.close()
+            delay = float(retry_after) if retry_after.isdigit() else DOWNLOAD_BACKOFF * 2 ** attempt
+            logging.info(f"Got {response.status_code} for {url}; retrying in {delay:.1f}s.")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            delay = DOWNLOAD_BACKOFF * 2 ** attempt
+            logging.info(f"Error fetching {url} ({e}); retrying in {delay:.1f}s.")
+        time.sleep(delay + random.uniform(0, delay / 2))
+
+
+def _write_capped(chunks, save_path: str, max_bytes: int) -> int:
+    """
+    Writes chunks to save_path via a temporary file, aborting once max_bytes is exceeded.
+    Returns the number of bytes written.
+    """
+    temp_path = f"{save_path}.part"
+    written = 0
+    try:
+        with open(temp_path, 'wb') as file:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                written += len(chunk)
+                if written > max_bytes:
+                    raise ValueError(f"exceeds size cap of {max_bytes} bytes")
+                file.write(chunk)
+        os.replace(temp_path, save_path)
+        return written
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _declared_too_large(response: requests.Response, max_bytes: int) -> bool:
+    length = response.headers.get("Content-Length", "")
+    return length.isdigit() and int(length) > max_bytes
+
+
+def _lookup(url: str):
+    """
+    Returns (cache, entry) for an asset URL; either may be None.
+    """
+    cache = get_scrape_cache()
+    return cache, cache.lookup(f"asset:{url}") if cache else None
+
+
+def _store(cache, url: str, response: requests.Response, path: str, content_type: str = None) -> None:
+    # Only responses with validators can be revalidated later, so only those are worth caching
+    cache.record(hit=False)
+    meta = validators(response)
+    if meta["etag"] or meta["last_modified"]:
+        cache.put_file(f"asset:{url}", path, content_type=content_type, **meta)
+
+
+def _prepend(head: bytes, chunks):
+    yield head
+    yield from chunks
+
+
+def fetch_asset(url: str, dest_dir: str, allowed_types: dict, max_bytes: int = DOWNLOAD_MAX_BYTES) -> str:
+    """
+    Downloads url into dest_dir if its sniffed content type is one of allowed_types
+    (a mapping of MIME type to file extension), reusing the cached copy if unchanged.
+    Returns the saved path, or None if the asset was skipped or failed.
+    """
+    cache, entry = _lookup(url)
+    try:
+        with request_with_retries(url, headers=conditional_headers(entry)) as response:
+            if entry and response.status_code == 304:
+                if entry.content_type not in allowed_types:
+                    return None
+                save_path = os.path.join(dest_dir, asset_filename(url, allowed_types[entry.content_type]))
+                cache.copy_to(entry, save_path)
+                cache.record(hit=True)
+                logging.info(f"Not modified, copied from cache: {save_path}")
+                return save_path
+            if _declared_too_large(response, max_bytes):
+                logging.warning(f"Skipping {url}: larger than {max_bytes} bytes.")
+                return None
+            chunks = response.iter_content(chunk_size=65536)
+            head = next(chunks, b"")
+            content_type = sniff_content_type(head, response.headers.get("Content-Type", ""))
+            if content_type not in allowed_types:
+                logging.info(f"Skipping {url}: unsupported content type '{content_type}'.")
+                return None
+            save_path = os.path.join(dest_dir, asset_filename(url, allowed_types[content_type]))
+            size = _write_capped(_prepend(head, chunks), save_path, max_bytes)
+            if cache:
+                _store(cache, url, response, save_path, content_type)
+        logging.info(f"Downloaded: {save_path} ({size} bytes)")
+        return save_path
+    except (requests.RequestException, ValueError, OSError) as e:
+        logging.error(f"Failed to download {url}: {e}")
+        return None
+
+
+def download_assets(assets: list[tuple[str, dict]], dest_dir: str, max_workers: int = DOWNLOAD_CONCURRENCY) -> list[str]:
+    """
+    Downloads (url, allowed_types) pairs concurrently over the pooled session.
+    Duplicate URLs are fetched once. Returns the paths that were saved, in input order.
+    """
+    unique = {}
+    for url, allowed_types in assets:
+        unique.setdefault(url, allowed_types)
+    if not unique:
+        return []
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(lambda item: fetch_asset(item[0], dest_dir, item[1]), unique.items()))
+    saved = [path for path in results if path]
+    logging.info(f"Downloaded {len(saved)}/{len(unique)} assets in {time.monotonic() - start:.1f}s.")
+    return saved
@@ -0,0 +1,210 @@
+# embedding_service.py
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_PROCESSES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+)
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of embeddings keyed by a hash of (model, backend, text).
+    The least recently used entries are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._db.commit()
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+        Returns {key: vector} for the keys that are cached.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+        return found
+
+    def put_many(self, items: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                # Evict down to 90% of capacity so eviction doesn't run on every insert
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - int(self.max_entries * 0.9),)
+                )
+            self._db.commit()
+
+
+class EmbeddingService(Embeddings):
+    """
+    LangChain-compatible embedding engine for sentence-transformers models.
+    Encodes in `batch_size` batches on the torch or ONNX backend, fans large batches out
+    over `processes` CPU worker processes, and never embeds a text twice thanks to the
+    disk-backed cache. Throughput is tracked in `stats()`.
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        backend: str = EMBEDDING_BACKEND,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        processes: int = EMBEDDING_PROCESSES,
+        cache: EmbeddingCache = None,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.processes = processes
+        self.cache = cache
+        self.texts_embedded = 0
+        self.cache_hits = 0
+        self.encode_seconds = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pool = None
+        self._model = None
+        self.load_seconds = None
+
+    @property
+    def model(self):
+        """
+        The SentenceTransformer, loaded on first use (or ahead of time by load()).
+        """
+        if self._model is None:
+            self.load()
+        return self._model
+
+    def load(self) -> None:
+        with self._load_lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = self._load_model()
+                self.load_seconds = time.perf_counter() - start
+                logging.info(f"Loaded embedding model {self.model_name} in {self.load_seconds:.2f}s.")
+
+    def _load_model(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "onnx":
+            # EMBEDDING_ONNX_FILE may point at a quantized int8 export, e.g. onnx/model_qint8_avx512_vnni.onnx
+            return SentenceTransformer(
+                self.model_name, device="cpu", backend="onnx", model_kwargs={"file_name": EMBEDDING_ONNX_FILE}
+            )
+        return SentenceTransformer(self.model_name, device="cpu")
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        # Worker processes only pay off once every process gets at least a full batch
+        if self.processes > 1 and len(texts) >= self.batch_size * self.processes:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                atexit.register(self.model.stop_multi_process_pool, self._pool)
+            return self.model.encode_multi_process(
+                texts, self._pool, batch_size=self.batch_size, normalize_embeddings=True
+            )
+        return self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}|{self.backend}|{text}".encode("utf-8")).hexdigest()
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeds texts and returns a (len(texts), dim) float32 matrix of normalized vectors.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        keys = [self._cache_key(text) for text in texts]
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+
+        # Encode each distinct uncached text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            start = time.perf_counter()
+            vectors = np.asarray(self._encode(list(missing.values())), dtype=np.float32)
+            elapsed = time.perf_counter() - start
+            fresh = dict(zip(missing.keys(), vectors))
+            if self.cache:
+                self.cache.put_many(fresh)
+            cached.update(fresh)
+            with self._lock:
+                self.texts_embedded += len(missing)
+                self.encode_seconds += elapsed
+            logging.info(
+                f"Embedded {len(missing)} texts in {elapsed:.2f}s "
+                f"({len(missing) / elapsed if elapsed else 0:.1f} texts/sec, backend={self.backend})."
+            )
+        with self._lock:
+            self.cache_hits += len(texts) - len(missing)
+        return np.vstack([cached[key] for key in keys])
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "texts_embedded": self.texts_embedded,
+                "cache_hits": self.cache_hits,
+                "encode_seconds": self.encode_seconds,
+                "texts_per_sec": self.texts_embedded / self.encode_seconds if self.encode_seconds else 0.0,
+            }
+
+
+def export_int8_onnx_model(output_dir: str, model_name: str = EMBEDDING_MODEL, quantization: str = "avx512_vnni") -> None:
+    """
+    Exports `model_name` as a dynamically quantized int8 ONNX model into output_dir.
+    Point EMBEDDING_MODEL at output_dir and EMBEDDING_ONNX_FILE at the written file to use it.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+    model.save(output_dir)
+    export_dynamic_quantized_onnx_model(model, quantization, output_dir)
+    logging.info(f"Quantized ONNX model written to {output_dir}")
@@ -0,0 +1,190 @@
+# html_to_markdown.py
+import re
+from bs4 import BeautifulSoup, NavigableString, Tag, Comment
+
+# Never content
+SKIP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "object", "embed",
+    "nav", "aside", "form", "button", "select", "input", "textarea", "dialog", "head",
+}
+# Site chrome, skipped unless they sit inside the page's <main>/<article>
+PAGE_CHROME_TAGS = {"header", "footer"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "menu", "dialog"}
+BOILERPLATE_HINTS = re.compile(
+    r"(^|[-_\s])(nav|navbar|menu|footer|sidebar|cookie|consent|banner|breadcrumbs?|social|share|"
+    r"advert|ads|promo|newsletter|popup|modal|skip-link)([-_\s]|$)",
+    re.I,
+)
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "footer", "ul", "ol", "dl", "table", "pre",
+    "blockquote", "hr", "figure", "figcaption", "details", "summary", "address", *HEADINGS,
+}
+
+
+def _is_boilerplate(tag: Tag, inside_content: bool) -> bool:
+    if tag.name in SKIP_TAGS:
+        return True
+    if tag.name in PAGE_CHROME_TAGS and not inside_content:
+        return True
+    if tag.has_attr("hidden") or tag.get("aria-hidden") == "true":
+        return True
+    if "display:none" in tag.get("style", "").replace(" ", "").lower():
+        return True
+    if tag.get("role") in BOILERPLATE_ROLES:
+        return True
+    hints = " ".join(tag.get("class", [])) + " " + tag.get("id", "")
+    return bool(BOILERPLATE_HINTS.search(hints))
+
+
+class _Renderer:
+    def __init__(self, inside_content: bool):
+        self.inside_content = inside_content
+        self.blocks = []
+
+    def inline(self, node, skip: set = frozenset()) -> str:
+        """
+        Renders inline content of node as a single line of Markdown text.
+        """
+        return self.inline_nodes(node.children, skip)
+
+    def inline_nodes(self, nodes, skip: set = frozenset()) -> str:
+        parts = []
+        for child in nodes:
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString):
+                parts.append(re.sub(r"\s+", " ", str(child)))
+                continue
+            if not isinstance(child, Tag) or child.name in skip or _is_boilerplate(child, self.inside_content):
+                continue
+            if child.name == "br":
+                parts.append(" ")
+            elif child.name in ("strong", "b"):
+                text = self.inline(child, skip).strip()
+                parts.append(f" **{text}** " if text else "")
+            elif child.name in ("em", "i"):
+                text = self.inline(child, skip).strip()
+                parts.append(f" *{text}* " if text else "")
+            elif child.name == "code":
+                text = child.get_text().strip()
+                parts.append(f" `{text}` " if text else "")
+            elif child.name == "img":
+                alt = child.get("alt", "").strip()
+                parts.append(f" {alt} " if alt else "")
+            else:
+                parts.append(" " + self.inline(child, skip) + " ")
+        text = re.sub(r"\s+", " ", "".join(parts)).strip()
+        return re.sub(r" ([.,;:!?)])", r"\1", text)  # Undo padding added around inline markup
+
+    def _flush(self, buffer: list) -> None:
+        text = re.sub(r"\s+", " ", " ".join(buffer)).strip()
+        if text:
+            self.blocks.append(text)
+        buffer.clear()
+
+    def block(self, node) -> None:
+        """
+        Renders node's children as Markdown blocks, grouping loose inline content into paragraphs.
+        """
+        buffer = []
+        for child in node.children:
+            if isinstance(child, Comment):
+                continue
+            if isinstance(child, NavigableString):
+                buffer.append(str(child))
+                continue
+            if not isinstance(child, Tag) or _is_boilerplate(child, self.inside_content):
+                continue
+            if child.name not in BLOCK_TAGS and not child.find(BLOCK_TAGS):
+                buffer.append(self.inline_nodes([child]))
+                continue
+            self._flush(buffer)
+            self.element(child)
+        self._flush(buffer)
+
+    def element(self, tag: Tag) -> None:
+        if tag.name in HEADINGS:
+            text = self.inline(tag)
+            if text:
+                self.blocks.append(f"{'#' * HEADINGS[tag.name]} {text}")
+        elif tag.name == "p":
+            text = self.inline(tag)
+            if text:
+                self.blocks.append(text)
+        elif tag.name in ("ul", "ol"):
+            lines = self.list_lines(tag, 0)
+            if lines:
+                self.blocks.append("\n".join(lines))
+        elif tag.name == "dl":
+            lines = []
+            for item in tag.find_all(["dt", "dd"], recursive=False):
+                text = self.inline(item)
+                if text:
+                    lines.append(f"**{text}**" if item.name == "dt" else f": {text}")
+            if lines:
+                self.blocks.append("\n".join(lines))
+        elif tag.name == "table":
+            table = self.table(tag)
+            if table:
+                self.blocks.append(table)
+        elif tag.name == "pre":
+            code = tag.get_text().strip("\n")
+            if code.strip():
+                self.blocks.append(f"```\n{code}\n```")
+        elif tag.name == "blockquote":
+            inner = _Renderer(self.inside_content)
+            inner.block(tag)
+            if inner.blocks:
+                self.blocks.append("\n".join(f"> {line}" for line in "\n\n".join(inner.blocks).splitlines()))
+        elif tag.name == "hr":
+            self.blocks.append("---")
+        else:
+            self.block(tag)
+
+    def list_lines(self, tag: Tag, depth: int) -> list[str]:
+        lines = []
+        for number, item in enumerate(tag.find_all("li", recursive=False), 1):
+            marker = f"{number}." if tag.name == "ol" else "-"
+            text = self.inline(item, skip={"ul", "ol"})
+            if text:
+                lines.append(f"{'  ' * depth}{marker} {text}")
+            for nested in item.find_all(["ul", "ol"]):
+                if nested.find_parent("li") is item:
+                    lines.extend(self.list_lines(nested, depth + 1))
+        return lines
+
+    def table(self, tag: Tag) -> str:
+        rows = []
+        for row in tag.find_all("tr"):
+            if row.find_parent("table") is not tag:
+                continue  # Belongs to a nested table
+            cells = [self.inline(cell).replace("|", "\\|") for cell in row.find_all(["th", "td"], recursive=False)]
+            if any(cells):
+                rows.append(cells)
+        if not rows:
+            return ""
+        width = max(len(row) for row in rows)
+        rows = [row + [""] * (width - len(row)) for row in rows]
+        lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+        lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+        caption = tag.find("caption")
+        if caption and self.inline(caption):
+            lines.insert(0, f"**{self.inline(caption)}**\n")
+        return "\n".join(lines)
+
+
+def html_to_markdown(html) -> str:
+    """
+    Converts a page (HTML string or BeautifulSoup) to Markdown, keeping headings, paragraphs,
+    lists, tables, code and quotes while dropping scripts, navigation, footers and other boilerplate.
+    The page's <main> or <article> is used when present, otherwise <body>.
+    """
+    soup = html if isinstance(html, (BeautifulSoup, Tag)) else BeautifulSoup(html, "html.parser")
+    root = soup.find("main") or soup.find("article")
+    inside_content = root is not None
+    root = root or soup.find("body") or soup
+    renderer = _Renderer(inside_content)
+    renderer.block(root)
+    markdown = "\n\n".join(renderer.blocks)
+    return re.sub(r"\n{3,}", "\n\n", markdown).strip() + "\n"
@@ -0,0 +1,180 @@
+# index_manifest.py
+import os
+import re
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from config import INDEX_MANIFEST_PATH
+
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Returns a deterministic vector ID for a chunk: a hash of its source and its content hash.
+    Re-ingesting identical content from the same source always yields the same ID.
+    """
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}\n{content_hash}".encode("utf-8")).hexdigest()
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value: int) -> tuple[int, int, int, int]:
+    return tuple((value >> (16 * n)) & 0xFFFF for n in range(4))
+
+
+class IndexManifest:
+    """
+    Local record of which chunk IDs each source currently has in the vector store,
+    used to upsert only new chunks and delete vanished ones on re-ingest.
+    It also holds an index version token that changes whenever the index does.
+    """
+
+    def __init__(self, path: str = INDEX_MANIFEST_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "source TEXT NOT NULL, chunk_id TEXT NOT NULL, PRIMARY KEY (source, chunk_id))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # SimHash of each chunk split into four 16-bit bands for near-duplicate lookups
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS simhashes ("
+            "source TEXT NOT NULL, chunk_id TEXT NOT NULL, hash INTEGER NOT NULL, "
+            "b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, PRIMARY KEY (source, chunk_id))"
+        )
+        for band in range(4):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS simhashes_b{band} ON simhashes (b{band})")
+        # Chunk texts with an FTS5 inverted index over them for BM25 keyword search
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_texts ("
+            "id INTEGER PRIMARY KEY, source TEXT NOT NULL, chunk_id TEXT NOT NULL, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, UNIQUE (source, chunk_id))"
+        )
+        try:
+            self._db.executescript(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5("
+                "text, content='chunk_texts', content_rowid='id', tokenize='porter unicode61');"
+                "CREATE TRIGGER IF NOT EXISTS chunk_texts_ai AFTER INSERT ON chunk_texts BEGIN "
+                "INSERT INTO chunk_fts (rowid, text) VALUES (new.id, new.text); END;"
+                "CREATE TRIGGER IF NOT EXISTS chunk_texts_ad AFTER DELETE ON chunk_texts BEGIN "
+                "INSERT INTO chunk_fts (chunk_fts, rowid, text) VALUES ('delete', old.id, old.text); END;"
+            )
+            self.keyword_search_available = True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"SQLite FTS5 unavailable, keyword search disabled: {e}")
+            self.keyword_search_available = False
+        self._db.commit()
+
+    def chunk_ids(self, source: str) -> set[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,)).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, source: str, ids, simhashes: dict = None, documents: dict = None) -> None:
+        """
+        Records chunk IDs for a source, optionally with each chunk's 64-bit SimHash ({id: hash})
+        and its text and metadata for keyword search ({id: (text, metadata)}).
+        """
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO chunks (source, chunk_id) VALUES (?, ?)", [(source, i) for i in ids]
+            )
+            if simhashes:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO simhashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(source, i, _signed(h), *_bands(h)) for i, h in simhashes.items()],
+                )
+            if documents:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO chunk_texts (source, chunk_id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(source, i, text, json.dumps(metadata)) for i, (text, metadata) in documents.items()],
+                )
+            self._db.commit()
+
+    def remove(self, source: str, ids) -> None:
+        with self._lock:
+            rows = [(source, i) for i in ids]
+            self._db.executemany("DELETE FROM chunks WHERE source = ? AND chunk_id = ?", rows)
+            self._db.executemany("DELETE FROM simhashes WHERE source = ? AND chunk_id = ?", rows)
+            self._db.executemany("DELETE FROM chunk_texts WHERE source = ? AND chunk_id = ?", rows)
+            self._db.commit()
+
+    def has_near_duplicate(self, simhash: int, exclude_source: str, max_distance: int) -> bool:
+        """
+        Returns True if a chunk of another source has a SimHash within max_distance bits.
+        """
+        bands = _bands(simhash)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT hash FROM simhashes WHERE (b0 = ? OR b1 = ? OR b2 = ? OR b3 = ?) AND source != ?",
+                (*bands, exclude_source),
+            ).fetchall()
+        return any((simhash ^ (row[0] & 0xFFFFFFFFFFFFFFFF)).bit_count() <= max_distance for row in rows)
+
+    def keyword_search(self, query: str, k: int) -> list[tuple[str, str, dict, float]]:
+        """
+        Ranks indexed chunks against the query's terms with BM25.
+        Returns up to k (chunk_id, text, metadata, score) tuples, best first.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms or not self.keyword_search_available:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t.chunk_id, t.text, t.metadata, bm25(chunk_fts) AS score FROM chunk_fts "
+                "JOIN chunk_texts t ON t.id = chunk_fts.rowid WHERE chunk_fts MATCH ? ORDER BY score LIMIT ?",
+                (match, k),
+            ).fetchall()
+        # FTS5's bm25() is lower-is-better; flip the sign so higher means more relevant
+        return [(chunk_id, text, json.loads(metadata), -score) for chunk_id, text, metadata, score in rows]
+
+    def sources(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT source FROM chunks ORDER BY source")]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chunks")
+            self._db.execute("DELETE FROM simhashes")
+            self._db.execute("DELETE FROM chunk_texts")
+            self._db.commit()
+        self.bump_version()
+
+    def version(self) -> str:
+        """
+        Returns a token that changes every time the index contents change (shared across processes).
+        """
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else ""
+
+    def bump_version(self) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(time.time_ns()),))
+            self._db.commit()
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_index_manifest() -> IndexManifest:
+    """
+    Returns the process-wide index manifest.
+    """
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = IndexManifest()
+        return _manifest
@@ -0,0 +1,260 @@
+# index_writer.py
+import re
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    PINECONE_API_KEY,
+    INDEX_NAME,
+    PINECONE_INDEX_HOST,
+    PINECONE_NAMESPACE_MODE,
+    INDEX_WRITE_BATCH_BYTES,
+    INDEX_WRITE_BATCH_VECTORS,
+    INDEX_WRITE_CONCURRENCY,
+    INDEX_WRITE_RETRIES,
+    INDEX_WRITE_BACKOFF,
+)
+from telemetry import traced, current_span
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DELETE_BATCH_IDS = 1000  # Pinecone's limit on IDs per delete request
+API_VERSION = "2024-07"
+
+
+class IndexWriteError(Exception):
+    """Raised when a write to the index still fails after all retries."""
+
+
+def namespace_for(source: str) -> str:
+    """
+    Returns the namespace a source's vectors are written to: "" (the default namespace) unless
+    PINECONE_NAMESPACE_MODE=site, in which case every site gets its own (e.g. "docs_example_com"),
+    so one site can be dropped or replaced without touching the others.
+    """
+    if PINECONE_NAMESPACE_MODE != "site":
+        return ""
+    host = urlparse(source).netloc or urlparse(f"//{source}").netloc or source
+    return re.sub(r"[^a-z0-9]+", "_", host.lower()).strip("_")
+
+
+def resolve_index_host() -> str:
+    """
+    Returns the data-plane URL of the index: PINECONE_INDEX_HOST if set (e.g. a local stand-in server),
+    otherwise the host Pinecone reports for INDEX_NAME.
+    """
+    if PINECONE_INDEX_HOST:
+        host = PINECONE_INDEX_HOST
+    else:
+        from pinecone import Pinecone
+
+        host = Pinecone(api_key=PINECONE_API_KEY).describe_index(INDEX_NAME).host
+    return (host if host.startswith(("http://", "https://")) else f"https://{host}").rstrip("/")
+
+
+class IndexWriter:
+    """
+    Writes to a Pinecone index over its REST data plane. Upserts are packed into requests of at most
+    `max_batch_bytes` of JSON (and `max_batch_vectors` vectors) that are sent `concurrency` at a time
+    over one pooled keep-alive session; throttled (429) and failed (5xx, connection error) requests
+    are retried with exponential backoff and jitter, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        host: str = None,
+        api_key: str = PINECONE_API_KEY,
+        max_batch_bytes: int = INDEX_WRITE_BATCH_BYTES,
+        max_batch_vectors: int = INDEX_WRITE_BATCH_VECTORS,
+        concurrency: int = INDEX_WRITE_CONCURRENCY,
+        retries: int = INDEX_WRITE_RETRIES,
+        backoff: float = INDEX_WRITE_BACKOFF,
+    ):
+        self.host = (host or resolve_index_host()).rstrip("/")
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_vectors = max_batch_vectors
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Api-Key": api_key or "",
+            "Content-Type": "application/json",
+            "X-Pinecone-API-Version": API_VERSION,
+        })
+        self._lock = threading.Lock()
+        self.vectors_written = 0
+        self.bytes_written = 0
+        self.requests_sent = 0
+        self.retried = 0
+        self.write_seconds = 0.0
+
+    def _post(self, path: str, body: bytes) -> dict:
+        """
+        POSTs a JSON body, retrying throttled and transient failures. Returns the decoded response.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(f"{self.host}{path}", data=body, timeout=60)
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        raise IndexWriteError(f"{path} failed: {response.status_code} - {response.text[:200]}")
+                    with self._lock:
+                        self.requests_sent += 1
+                    return response.json() if response.content else {}
+                reason = f"HTTP {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                reason, retry_after = str(e), None
+            if attempt == self.retries:
+                raise IndexWriteError(f"{path} failed after {attempt + 1} attempts: {reason}")
+            delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+            if retry_after and retry_after.replace(".", "", 1).isdigit():
+                delay = max(delay, float(retry_after))
+            with self._lock:
+                self.retried += 1
+            logging.warning(f"Index write {path} ({reason}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _batches(self, records: list[str]):
+        # Packs pre-serialized records into batches under both the byte and the vector limit
+        batch, size = [], 0
+        for record in records:
+            if batch and (size + len(record) + 1 > self.max_batch_bytes or len(batch) >= self.max_batch_vectors):
+                yield batch
+                batch, size = [], 0
+            batch.append(record)
+            size += len(record) + 1
+        if batch:
+            yield batch
+
+    def _send_all(self, path: str, bodies) -> int:
+        """
+        Sends request bodies concurrently, at most 2 * concurrency held at a time.
+        Returns the number of bytes sent; the first failure is raised once in-flight requests finish.
+        """
+        sent = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            for body in bodies:
+                pending.append(pool.submit(self._post, path, body))
+                sent += len(body)
+                if len(pending) >= 2 * self.concurrency:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        return sent
+
+    @traced("index_writer.upsert")
+    def upsert(self, texts: list[str], vectors, metadatas: list[dict], ids: list[str], namespace: str = "") -> int:
+        """
+        Upserts vectors with their metadata (text stored under "text", like PineconeVectorStore)
+        into `namespace`. Returns the number of vectors written.
+        """
+        start = time.perf_counter()
+        # float32 values at their shortest round-trip repr: about half the JSON of float64 reprs
+        values = np.asarray(vectors, dtype=np.float32)
+        records = [
+            f'{{"id":{json.dumps(ids[n])},"values":[{",".join(map(str, values[n]))}],'
+            f'"metadata":{json.dumps({**metadatas[n], "text": texts[n]})}}}'
+            for n in range(len(ids))
+        ]
+        suffix = f'],"namespace":{json.dumps(namespace)}}}'
+        bodies = (('{"vectors":[' + ",".join(batch) + suffix).encode("utf-8") for batch in self._batches(records))
+        sent = self._send_all("/vectors/upsert", bodies)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.vectors_written += len(records)
+            self.bytes_written += sent
+            self.write_seconds += elapsed
+        current_span().set(vectors=len(records), bytes=sent)
+        logging.info(
+            f"Upserted {len(records)} vectors ({sent / 1e6:.2f} MB) to namespace {namespace!r} in {elapsed:.2f}s "
+            f"({len(records) / elapsed if elapsed else 0:.0f} vectors/sec)."
+        )
+        return len(records)
+
+    @traced("index_writer.delete")
+    def delete(self, ids: list[str], namespace: str = "") -> None:
+        """
+        Deletes vectors by ID from `namespace`, in concurrent batches.
+        """
+        bodies = (
+            json.dumps({"ids": ids[n:n + DELETE_BATCH_IDS], "namespace": namespace}).encode("utf-8")
+            for n in range(0, len(ids), DELETE_BATCH_IDS)
+        )
+        self._send_all("/vectors/delete", bodies)
+        current_span().set(ids=len(ids))
+
+    def delete_namespace(self, namespace: str) -> None:
+        """
+        Deletes every vector in one namespace (one site, in site mode).
+        """
+        self._post("/vectors/delete", json.dumps({"deleteAll": True, "namespace": namespace}).encode("utf-8"))
+        logging.info(f"Deleted namespace {namespace!r}.")
+
+    def namespaces(self) -> dict:
+        """
+        Returns {namespace: vector_count} as reported by the index.
+        """
+        stats = self._post("/describe_index_stats", b"{}")
+        return {name: info.get("vectorCount", 0) for name, info in stats.get("namespaces", {}).items()}
+
+    def delete_all(self) -> None:
+        """
+        Deletes every namespace of the index.
+        """
+        for namespace in self.namespaces():
+            self.delete_namespace(namespace)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "vectors_written": self.vectors_written,
+                "bytes_written": self.bytes_written,
+                "requests": self.requests_sent,
+                "retries": self.retried,
+                "write_seconds": self.write_seconds,
+                "vectors_per_sec": self.vectors_written / self.write_seconds if self.write_seconds else 0.0,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_index_writer() -> IndexWriter:
+    """
+    Returns the process-wide index writer, creating it (and resolving the index host) on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = IndexWriter()
+        return _writer
+
+
+if __name__ == "__main__":
+    # Usage: python index_writer.py [vectors] [dim]
+    # Writes random vectors to a scratch namespace, reports vectors/sec and deletes them again.
+    # Point PINECONE_INDEX_HOST at a local stand-in (mock_services.serve_mock_pinecone) to test offline.
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    writer = get_index_writer()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    ids = [f"bench-{n}" for n in range(count)]
+    writer.upsert([f"text {n}" for n in range(count)], vectors, [{"source": "benchmark"}] * count, ids, "index-writer-benchmark")
+    writer.delete_namespace("index-writer-benchmark")
+    print(json.dumps(writer.stats(), indent=2))
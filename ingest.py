@@ -0,0 +1,147 @@
+# ingest.py
+import os
+import shutil
+import logging
+from scraper import combine_text_images_pdf_parts, list_assets, PAGE_MARKDOWN_FILE, COMBINED_PDF_PREFIX
+from llama_parser import parse_pdfs
+from document_processor import index_documents, load_and_process_document, remove_source
+from pdf_extractor import ExtractionStats, iter_pdf_documents
+from index_manifest import get_index_manifest
+from config import PDF_EXTRACTION_MODE
+
+
+def cleanup_scrape_dir(dir_name: str) -> None:
+    """
+    Deletes a page's scrape directory, and its domain directory once that is empty.
+    """
+    try:
+        shutil.rmtree(dir_name)
+        logging.info(f"Successfully deleted directory: {dir_name}")
+    except Exception as e:
+        logging.warning(f"Could not delete directory {dir_name}: {e}")
+        return
+    try:
+        os.rmdir(os.path.dirname(dir_name))
+    except OSError:
+        pass  # Other pages of the same domain are still being processed
+
+
+def assets_source(url: str) -> str:
+    """
+    Returns the index source key for a page's images and PDFs, kept separate from the page text
+    so each can be re-indexed on its own.
+    """
+    return f"{url}#assets"
+
+
+def index_page_text(dir_name: str, url: str) -> tuple[bool, str]:
+    """
+    Indexes the page's locally extracted Markdown, falling back to the raw text if the
+    extractor found no main content. Returns (success, message).
+    """
+    md_file = os.path.join(dir_name, PAGE_MARKDOWN_FILE)
+    if not os.path.exists(md_file) or os.path.getsize(md_file) <= 1:  # Only the trailing newline
+        md_file = os.path.join(dir_name, "page_content.txt")
+    return load_and_process_document(md_file, source_url=url)
+
+
+def pdf_source(url: str, pdf_path: str) -> str:
+    """
+    Returns the index source key for one PDF linked from a page.
+    """
+    return f"{url}#pdf:{os.path.basename(pdf_path)}"
+
+
+def index_page_pdfs(pdfs: list[str], url: str) -> tuple[bool, str]:
+    """
+    Extracts each PDF locally, page by page across worker processes, and indexes it under its
+    own source. Sources of PDFs the page no longer links to are removed.
+    Returns (success, message).
+    """
+    messages = []
+    success = True
+    for pdf_path in pdfs:
+        stats = ExtractionStats()
+        indexed, message = index_documents(iter_pdf_documents(pdf_path, pdf_source(url, pdf_path), stats), pdf_source(url, pdf_path))
+        success = success and indexed
+        messages.append(f"{os.path.basename(pdf_path)}: {stats.pages} pages at {stats.pages_per_sec:.1f} pages/sec. {message}")
+
+    current = {pdf_source(url, pdf_path) for pdf_path in pdfs}
+    prefix = pdf_source(url, "")
+    for source in get_index_manifest().sources():
+        if source.startswith(prefix) and source not in current:
+            remove_source(source)
+    return success, " ".join(messages)
+
+
+def remote_parse_assets(dir_name: str) -> list[str]:
+    """
+    Returns the downloaded assets that need LlamaParse: images, plus PDFs unless they are extracted locally.
+    """
+    images, pdfs = list_assets(dir_name)
+    return images + ([] if PDF_EXTRACTION_MODE == "local" else pdfs)
+
+
+def parse_pdf_parts(parts: list[str], md_file: str) -> str:
+    """
+    Parses PDF parts concurrently with LlamaParse and concatenates their Markdown in order into
+    `md_file`; a single part's Markdown is used as is.
+    Returns the Markdown path, or None if any part failed.
+    """
+    results = parse_pdfs(parts)
+    failed = [part for part in parts if not results.get(part)]
+    if failed:
+        logging.error(f"Failed to process {len(failed)} of {len(parts)} PDF parts with LlamaParser: {failed}")
+        return None
+    if len(parts) == 1:
+        return results[parts[0]]
+    with open(md_file, "w", encoding="utf-8") as out:
+        for part in parts:
+            with open(results[part], "r", encoding="utf-8") as part_md:
+                shutil.copyfileobj(part_md, out)
+            out.write("\n\n")
+    return md_file
+
+
+def parse_page_assets(dir_name: str, url: str) -> tuple[bool, str, str]:
+    """
+    Combines the page's images (and, in llamaparse mode, its PDFs) into size-capped PDF parts and
+    parses the parts concurrently with LlamaParse. This is the network-bound stage between scraping
+    and indexing. The parts' Markdown is concatenated in order into one file.
+    Returns (success, message, markdown_path); markdown_path is None when nothing needed parsing.
+    """
+    if not remote_parse_assets(dir_name):
+        return True, "No assets to parse.", None
+    final_pdf = os.path.join(dir_name, f"{COMBINED_PDF_PREFIX}.pdf")
+    parts = combine_text_images_pdf_parts(
+        dir_name, final_pdf, include_text=False, include_pdfs=PDF_EXTRACTION_MODE != "local"
+    )
+    if not parts:
+        return False, f"Failed to combine assets into a PDF for {url}", None
+    logging.info(f"Combined asset PDF created in {len(parts)} part(s): {parts}")
+    md_file = parse_pdf_parts(parts, os.path.join(dir_name, f"{COMBINED_PDF_PREFIX}.md"))
+    if not md_file:
+        return False, f"Failed to process the PDF parts with LlamaParser for {url}", None
+    return True, f"Parsed assets: {md_file}", md_file
+
+
+def index_parsed_assets(dir_name: str, url: str, md_file: str = None) -> tuple[bool, str]:
+    """
+    Indexes the page's assets: PDFs extracted locally (in local mode) and the LlamaParse
+    Markdown from parse_page_assets. Stale asset chunks are removed when there is none.
+    Returns (success, message).
+    """
+    messages = []
+    success = True
+    if PDF_EXTRACTION_MODE == "local":
+        _, pdfs = list_assets(dir_name)
+        success, pdf_message = index_page_pdfs(pdfs, url)
+        if pdf_message:
+            messages.append(pdf_message)
+    if not md_file:
+        removed = remove_source(assets_source(url))
+        messages.append(f"No parsed assets ({removed} stale asset chunks removed).")
+        return success, " ".join(messages)
+    indexed, message = load_and_process_document(md_file, source_url=assets_source(url))
+    return success and indexed, " ".join(messages + [message])
+
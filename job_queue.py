@@ -0,0 +1,502 @@
+# job_queue.py
+import os
+import sys
+import json
+import atexit
+import signal
+import time
+import sqlite3
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from telemetry import span, trace
+from config import (
+    JOB_QUEUE_PATH,
+    JOB_WORKERS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BACKOFF,
+    JOB_LEASE_SECONDS,
+    JOB_POLL_INTERVAL,
+    JOB_SHUTDOWN_TIMEOUT,
+    CRAWL_PER_HOST_DELAY,
+    CRAWL_PER_HOST_CONCURRENCY,
+)
+
+# Every URL flows through these stages in order; each stage has its own workers
+STAGES = ("crawl", "parse", "index")
+
+
+class HostBusy(Exception):
+    """Raised by a crawl task whose host already has CRAWL_PER_HOST_CONCURRENCY pages in flight."""
+
+
+class JobQueue:
+    """
+    Persistent ingestion queue in SQLite, shared by the UI and the worker processes.
+    A job is one "Scrape & Process" request; it fans out into one task per URL and stage.
+    Tasks are claimed with a lease (a crashed worker's task is picked up again once the lease
+    expires), failed tasks are retried with backoff up to `max_attempts`, and cancelling a job
+    drops its queued tasks.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, max_attempts: int = JOB_MAX_ATTEMPTS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_attempts = max_attempts
+        # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE transactions
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, status TEXT NOT NULL, options TEXT NOT NULL, "
+            "created REAL NOT NULL, finished REAL);"
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY, job_id INTEGER NOT NULL, stage TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL, "
+            "lease_until REAL, worker TEXT, message TEXT, updated REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (stage, status, available_at);"
+            "CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id, status);"
+            "CREATE TABLE IF NOT EXISTS job_urls (job_id INTEGER NOT NULL, url TEXT NOT NULL, PRIMARY KEY (job_id, url));"
+            "CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, next_allowed REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS host_leases (task_id INTEGER PRIMARY KEY, host TEXT NOT NULL, lease_until REAL NOT NULL);"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")  # Serializes writers across processes
+        try:
+            yield
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    # Jobs
+
+    def submit(self, urls: list[str], options: dict) -> int:
+        """
+        Creates a job and queues a crawl task for each distinct URL.
+        `options` holds scrape_images, scrape_pdfs, follow_links, max_depth and max_pages.
+        Returns the job ID.
+        """
+        from crawler import normalize_url
+
+        now = time.time()
+        with self._transaction():
+            job_id = self._db.execute(
+                "INSERT INTO jobs (status, options, created) VALUES ('running', ?, ?)", (json.dumps(options), now)
+            ).lastrowid
+            for url in urls:
+                normalized = normalize_url(str(url))
+                if normalized and self._add_url(job_id, normalized):
+                    self._enqueue(job_id, "crawl", {"url": normalized, "depth": 0}, now)
+            self._finish_if_done(job_id)  # A job without valid URLs is done right away
+        logging.info(f"Submitted job {job_id} with {len(urls)} URLs.")
+        return job_id
+
+    def options(self, job_id: int) -> dict:
+        row = self._db.execute("SELECT options FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["options"]) if row else {}
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Cancels a job: queued tasks are dropped and running ones finish without queueing follow-ups.
+        """
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'running'", (now, job_id)
+            )
+            self._db.execute(
+                "UPDATE tasks SET status = 'cancelled', updated = ? WHERE job_id = ? AND status = 'queued'", (now, job_id)
+            )
+        logging.info(f"Cancelled job {job_id}.")
+
+    def is_cancelled(self, job_id: int) -> bool:
+        row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or row["status"] == "cancelled"
+
+    def jobs(self, limit: int = 10) -> list[dict]:
+        """
+        Returns the most recent jobs with per-stage task counts, newest first.
+        """
+        jobs = [dict(row) for row in self._db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+        for job in jobs:
+            job["progress"] = self.progress(job["id"])
+            job["pages_per_minute"] = self.pages_per_minute(job["id"], job["created"], job["finished"])
+        return jobs
+
+    def pages_per_minute(self, job_id: int, created: float, finished: float = None) -> float:
+        """
+        Returns the job's crawl rate: finished crawl tasks per minute since the job was created
+        (until it finished, for finished jobs).
+        """
+        row = self._db.execute(
+            "SELECT COUNT(*) AS n FROM tasks WHERE job_id = ? AND stage = 'crawl' AND status IN ('done', 'failed')",
+            (job_id,),
+        ).fetchone()
+        elapsed = (finished or time.time()) - created
+        return row["n"] * 60 / elapsed if elapsed > 0 else 0.0
+
+    def queue_depth(self) -> dict:
+        """
+        Returns {stage: {"queued": n, "running": n}} over all jobs.
+        """
+        depth = {stage: {"queued": 0, "running": 0} for stage in STAGES}
+        for row in self._db.execute(
+            "SELECT stage, status, COUNT(*) AS n FROM tasks WHERE status IN ('queued', 'running') GROUP BY stage, status"
+        ):
+            depth[row["stage"]][row["status"]] = row["n"]
+        return depth
+
+    def progress(self, job_id: int) -> dict:
+        """
+        Returns {stage: {status: count}} for a job.
+        """
+        progress = {stage: {} for stage in STAGES}
+        for row in self._db.execute(
+            "SELECT stage, status, COUNT(*) AS n FROM tasks WHERE job_id = ? GROUP BY stage, status", (job_id,)
+        ):
+            progress[row["stage"]][row["status"]] = row["n"]
+        return progress
+
+    def messages(self, job_id: int, limit: int = 20) -> list[dict]:
+        """
+        Returns the latest finished tasks of a job with their result or error message.
+        """
+        return [
+            dict(row) for row in self._db.execute(
+                "SELECT stage, status, attempts, payload, message FROM tasks "
+                "WHERE job_id = ? AND status IN ('done', 'failed') ORDER BY updated DESC LIMIT ?",
+                (job_id, limit),
+            )
+        ]
+
+    def _finish_if_done(self, job_id: int) -> None:
+        row = self._db.execute(
+            "SELECT COUNT(*) AS n FROM tasks WHERE job_id = ? AND status IN ('queued', 'running')", (job_id,)
+        ).fetchone()
+        if row["n"] == 0:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', finished = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+            )
+
+    # Tasks
+
+    def _add_url(self, job_id: int, url: str, max_pages: int = None) -> bool:
+        # Records a URL for a job unless it was seen already or the job's page budget is spent
+        if max_pages is not None:
+            count = self._db.execute("SELECT COUNT(*) AS n FROM job_urls WHERE job_id = ?", (job_id,)).fetchone()["n"]
+            if count >= max_pages:
+                return False
+        return self._db.execute("INSERT OR IGNORE INTO job_urls VALUES (?, ?)", (job_id, url)).rowcount == 1
+
+    def _enqueue(self, job_id: int, stage: str, payload: dict, available_at: float) -> None:
+        self._db.execute(
+            "INSERT INTO tasks (job_id, stage, payload, status, available_at, updated) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, stage, json.dumps(payload), available_at, time.time()),
+        )
+
+    def claim(self, stage: str, worker: str) -> dict:
+        """
+        Leases the oldest available task of a stage to `worker`; expired leases are reclaimed.
+        Returns the task as a dict (payload decoded), or None if there is nothing to do.
+        """
+        now = time.time()
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT * FROM tasks WHERE stage = ? AND ((status = 'queued' AND available_at <= ?) "
+                "OR (status = 'running' AND lease_until < ?)) ORDER BY available_at, id LIMIT 1",
+                (stage, now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE tasks SET status = 'running', attempts = attempts + 1, worker = ?, lease_until = ?, updated = ? "
+                "WHERE id = ?",
+                (worker, now + JOB_LEASE_SECONDS, now, row["id"]),
+            )
+        task = dict(row)
+        task["attempts"] += 1
+        task["payload"] = json.loads(task["payload"])
+        return task
+
+    def complete(self, task: dict, message: str, status: str = "done", follow_ups: list = None) -> bool:
+        """
+        Finishes a task and queues its `follow_ups`, (stage, payload) pairs, in the same transaction.
+        Crawl follow-ups are only queued for URLs new to the job and within its max_pages budget, and
+        a cancelled job gets none. Nothing is written if the task's lease was lost to another worker.
+        Returns True if the task was completed.
+        """
+        job_id = task["job_id"]
+        now = time.time()
+        with self._transaction():
+            updated = self._db.execute(
+                "UPDATE tasks SET status = ?, message = ?, lease_until = NULL, updated = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (status, message, now, task["id"], task["attempts"]),
+            ).rowcount
+            if not updated:
+                return False
+            if follow_ups and not self.is_cancelled(job_id):
+                max_pages = self.options(job_id).get("max_pages", 0)
+                for stage, payload in follow_ups:
+                    if stage == "crawl" and not self._add_url(job_id, payload["url"], max_pages):
+                        continue
+                    self._enqueue(job_id, stage, payload, now)
+            self._finish_if_done(job_id)
+        return True
+
+    def fail(self, task: dict, error: str) -> bool:
+        """
+        Records a failed attempt and requeues the task with exponential backoff while attempts remain.
+        Returns True if the task will be retried.
+        """
+        retry = task["attempts"] < self.max_attempts and not self.is_cancelled(task["job_id"])
+        if not retry:
+            self.complete(task, error, status="failed")
+            return False
+        delay = JOB_RETRY_BACKOFF * 2 ** (task["attempts"] - 1)
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE tasks SET status = 'queued', message = ?, lease_until = NULL, available_at = ?, updated = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (error, now + delay, now, task["id"], task["attempts"]),
+            )
+        return True
+
+    def defer(self, task: dict, delay: float) -> None:
+        """
+        Puts a claimed task back in the queue for `delay` seconds without counting the attempt.
+        """
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE tasks SET status = 'queued', attempts = attempts - 1, lease_until = NULL, available_at = ?, "
+                "updated = ? WHERE id = ?",
+                (now + delay, now, task["id"]),
+            )
+
+    def acquire_host(self, host: str, task_id: int, concurrency: int = CRAWL_PER_HOST_CONCURRENCY,
+                     delay: float = CRAWL_PER_HOST_DELAY) -> float:
+        """
+        Leases one of a host's `concurrency` slots to a task and reserves its next request time,
+        across all crawl workers. Leases of crashed workers expire after JOB_LEASE_SECONDS.
+        Returns how many seconds the caller must wait before its request, or None if the host is busy.
+        """
+        now = time.time()
+        with self._transaction():
+            self._db.execute("DELETE FROM host_leases WHERE lease_until < ?", (now,))
+            active = self._db.execute(
+                "SELECT COUNT(*) AS n FROM host_leases WHERE host = ? AND task_id != ?", (host, task_id)
+            ).fetchone()["n"]
+            if active >= max(1, concurrency):
+                return None
+            self._db.execute("INSERT OR REPLACE INTO host_leases VALUES (?, ?, ?)", (task_id, host, now + JOB_LEASE_SECONDS))
+            row = self._db.execute("SELECT next_allowed FROM hosts WHERE host = ?", (host,)).fetchone()
+            slot = max(now, row["next_allowed"] if row else 0.0)
+            self._db.execute("INSERT OR REPLACE INTO hosts VALUES (?, ?)", (host, slot + delay))
+        return slot - now
+
+    def release_host(self, task_id: int) -> None:
+        self._db.execute("DELETE FROM host_leases WHERE task_id = ?", (task_id,))
+
+
+_local = threading.local()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns this thread's job queue handle (transactions on one SQLite connection must not interleave,
+    and Streamlit serves each session from its own thread).
+    """
+    if not hasattr(_local, "queue"):
+        _local.queue = JobQueue()
+    return _local.queue
+
+
+def handle_crawl(queue: JobQueue, task: dict, options: dict) -> tuple[str, list]:
+    """
+    Scrapes one page (per-host concurrency and rate limited across workers), follows same-host links
+    within the job's depth and page budget, and hands the page on to the parse stage.
+    Returns (message, follow_ups).
+    """
+    from crawler import normalize_url, url_host
+    from scraper import scrape_page, read_links
+
+    url, depth = task["payload"]["url"], task["payload"]["depth"]
+    wait = queue.acquire_host(url_host(url), task["id"])
+    if wait is None:
+        raise HostBusy(url_host(url))
+    try:
+        time.sleep(wait)
+        dir_name = scrape_page(
+            url, options.get("scrape_images", True), options.get("scrape_pdfs", True), run_id=f"job{task['job_id']}"
+        )
+    finally:
+        queue.release_host(task["id"])
+    if not dir_name:
+        raise RuntimeError(f"Failed to scrape {url}")
+    links = {}
+    if options.get("follow_links") and depth < options.get("max_depth", 0):
+        for link in read_links(dir_name):
+            normalized = normalize_url(link)
+            if normalized and url_host(normalized) == url_host(url):
+                links[normalized] = None  # Ordered and without duplicates
+    follow_ups = [("crawl", {"url": link, "depth": depth + 1}) for link in links]
+    follow_ups.append(("parse", {"url": url, "dir_name": dir_name}))
+    return f"Scraped {url} ({len(links)} same-host links found).", follow_ups
+
+
+def handle_parse(queue: JobQueue, task: dict, options: dict) -> tuple[str, list]:
+    """
+    Sends the page's images (and PDFs in llamaparse mode) to LlamaParse, then hands the page on to indexing.
+    Returns (message, follow_ups).
+    """
+    from ingest import parse_page_assets
+
+    url, dir_name = task["payload"]["url"], task["payload"]["dir_name"]
+    md_file = None
+    if options.get("scrape_images", True) or options.get("scrape_pdfs", True):
+        success, message, md_file = parse_page_assets(dir_name, url)
+        if not success:
+            raise RuntimeError(message)
+    return f"Parsed assets of {url}.", [("index", {"url": url, "dir_name": dir_name, "assets_md": md_file})]
+
+
+def handle_index(queue: JobQueue, task: dict, options: dict) -> tuple[str, list]:
+    """
+    Indexes the page text, locally extracted PDFs and parsed assets, then deletes the scrape directory.
+    Returns (message, follow_ups); this is the last stage, so there are none.
+    """
+    from ingest import index_page_text, index_parsed_assets, cleanup_scrape_dir
+
+    url, dir_name = task["payload"]["url"], task["payload"]["dir_name"]
+    success, message = index_page_text(dir_name, url)
+    if not success:
+        raise RuntimeError(message)
+    if options.get("scrape_images", True) or options.get("scrape_pdfs", True):
+        success, assets_message = index_parsed_assets(dir_name, url, task["payload"].get("assets_md"))
+        message = f"{message} Assets: {assets_message}"
+        if not success:
+            raise RuntimeError(message)
+    cleanup_scrape_dir(dir_name)
+    return message, []
+
+
+HANDLERS = {"crawl": handle_crawl, "parse": handle_parse, "index": handle_index}
+
+
+def worker_loop(stage: str, stop_event=None) -> None:
+    """
+    Claims and runs tasks of one stage until stop_event is set or the parent process exits.
+    Runs in its own process.
+    """
+    # Ctrl+C reaches the whole process group; the parent stops workers through stop_event instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = multiprocessing.parent_process()
+    queue = get_job_queue()
+    worker = f"{stage}-{os.getpid()}"
+    logging.info(f"Worker {worker} started.")
+    while not (stop_event and stop_event.is_set()) and (parent is None or parent.is_alive()):
+        task = queue.claim(stage, worker)
+        if task is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        if queue.is_cancelled(task["job_id"]):
+            queue.complete(task, "Job cancelled.", status="cancelled")
+            continue
+        try:
+            # Spans of every task of a job share one trace, so the job's breakdown spans all workers
+            with trace(f"job-{task['job_id']}"), span(f"job.{stage}", url=task["payload"].get("url"), attempt=task["attempts"]):
+                message, follow_ups = HANDLERS[stage](queue, task, queue.options(task["job_id"]))
+            if queue.complete(task, message, follow_ups=follow_ups):
+                logging.info(f"[{worker}] task {task['id']} done: {message}")
+            else:
+                logging.warning(f"[{worker}] task {task['id']} lost its lease to another worker; result dropped.")
+        except HostBusy:
+            queue.defer(task, JOB_POLL_INTERVAL)  # Other hosts' pages go first meanwhile
+        except Exception as e:
+            retried = queue.fail(task, str(e))
+            logging.error(f"[{worker}] task {task['id']} failed (attempt {task['attempts']}): {e}")
+            if not retried and "dir_name" in task["payload"]:
+                from ingest import cleanup_scrape_dir
+
+                cleanup_scrape_dir(task["payload"]["dir_name"])
+
+
+def start_workers(counts: dict = None, stop_event=None) -> list:
+    """
+    Starts `counts[stage]` worker processes per stage (JOB_WORKERS by default).
+    Workers are not daemons, because daemon processes cannot start the process pools used for
+    PDF extraction and embedding; stop them with stop_workers.
+    Returns the processes.
+    """
+    counts = counts or JOB_WORKERS
+    context = multiprocessing.get_context("spawn")  # No inherited threads, browsers or SQLite handles
+    processes = []
+    for stage in STAGES:
+        for _ in range(counts.get(stage, 0)):
+            process = context.Process(target=worker_loop, args=(stage, stop_event), name=f"{stage}-worker")
+            process.start()
+            processes.append(process)
+    logging.info(f"Started job workers: {counts}")
+    return processes
+
+
+def stop_workers(processes: list, stop_event, timeout: float = JOB_SHUTDOWN_TIMEOUT) -> None:
+    """
+    Sets stop_event and waits up to `timeout` seconds for the workers to finish their current task.
+    Workers still running after that are terminated; their tasks are picked up again once the lease expires.
+    """
+    stop_event.set()
+    deadline = time.time() + timeout
+    for process in processes:
+        process.join(max(0.0, deadline - time.time()))
+    for process in processes:
+        if process.is_alive():
+            logging.warning(f"Terminating worker {process.pid} ({process.name}) after {timeout}s.")
+            process.terminate()
+            process.join()
+
+
+_workers = []
+_stop_event = None
+
+
+def ensure_workers() -> list:
+    """
+    Starts the worker processes once per process (e.g. the Streamlit server) and restarts any that died.
+    The workers are stopped when this process exits.
+    """
+    global _workers, _stop_event
+    if not _workers:
+        _stop_event = multiprocessing.get_context("spawn").Event()
+        _workers = start_workers(stop_event=_stop_event)
+        atexit.register(stop_workers, _workers, _stop_event)  # Restarts replace entries of this same list
+    else:
+        for n, process in enumerate(_workers):
+            if not process.is_alive():
+                stage = process.name.removesuffix("-worker")
+                _workers[n] = start_workers({stage: 1}, _stop_event)[0]
+    return _workers
+
+
+if __name__ == "__main__":
+    # Usage: python job_queue.py [crawl=N parse=N index=N] -- runs workers without the UI
+    worker_counts = dict(JOB_WORKERS)
+    for arg in sys.argv[1:]:
+        stage_name, _, count = arg.partition("=")
+        worker_counts[stage_name] = int(count)
+    worker_stop = multiprocessing.get_context("spawn").Event()
+    worker_processes = start_workers(worker_counts, worker_stop)
+    atexit.register(stop_workers, worker_processes, worker_stop)
+    try:
+        for worker_process in worker_processes:
+            worker_process.join()
+    except KeyboardInterrupt:
+        logging.info("Stopping job workers...")
@@ -1,81 +1,197 @@
 # llama_parser.py
 import os
 import time
+import random
+import asyncio
 import logging
-import requests
-from config import LLAMA_API_KEY
+import httpx
+from config import (
+    LLAMA_API_KEY,
+    LLAMA_PARSE_BASE_URL,
+    LLAMA_PARSE_CONCURRENCY,
+    LLAMA_PARSE_TIMEOUT,
+    LLAMA_PARSE_RETRIES,
+    LLAMA_PARSE_POLL_INITIAL,
+    LLAMA_PARSE_POLL_MAX,
+)
+from scrape_cache import get_scrape_cache, hash_file
+from telemetry import traced, current_span
 
-def check_job_status_and_get_results(job_id: str) -> str:
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ParseError(Exception):
+    """Raised when a LlamaParse job fails, is rejected, or misses its deadline."""
+
+
+def _headers() -> dict:
+    return {
+        'Authorization': f'Bearer {LLAMA_API_KEY}',
+        'accept': 'application/json',
+        'premium_mode': 'true',
+    }
+
+
+def _backoff(attempt: int, initial: float, maximum: float) -> float:
+    # Exponential backoff with +/-25% jitter so concurrent jobs don't poll in lockstep
+    return min(initial * 2 ** attempt, maximum) * random.uniform(0.75, 1.25)
+
+
+async def _request(client: httpx.AsyncClient, method: str, url: str, deadline: float, **kwargs) -> httpx.Response:
     """
-    Checks the job status and retrieves results once the job is completed.
-    Returns the structured Markdown output or an empty string if failed.
+    Sends a request, retrying transport errors, 429 and 5xx responses with backoff
+    until LLAMA_PARSE_RETRIES is exhausted or the deadline passes.
     """
-    status_url = f"https://api.cloud.llamaindex.ai/api/parsing/job/{job_id}"
-    headers = {"Authorization": f"Bearer {LLAMA_API_KEY}"}
-    while True:
+    for attempt in range(LLAMA_PARSE_RETRIES + 1):
         try:
-            response = requests.get(status_url, headers=headers)
-            if response.status_code == 200:
-                job_status = response.json().get("status")
-                if job_status == "SUCCESS":
-                    result_url = f"https://api.cloud.llamaindex.ai/api/parsing/job/{job_id}/result/markdown"
-                    result_response = requests.get(result_url, headers=headers)
-                    if result_response.status_code == 200:
-                        return result_response.json().get("markdown", "")
-                    else:
-                        logging.error(f"Error fetching results: {result_response.status_code} - {result_response.text}")
-                        return ""
-                elif job_status == "FAILED":
-                    logging.error("Job failed!")
-                    return ""
-                else:
-                    logging.info(f"Job status: {job_status}. Waiting for completion...")
-                    time.sleep(10)
-            else:
-                logging.error(f"Error checking job status: {response.status_code} - {response.text}")
-                return ""
-        except Exception as e:
-            logging.error(f"Exception while checking job status: {e}")
-            return ""
+            response = await client.request(method, url, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == LLAMA_PARSE_RETRIES:
+                return response
+            reason = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            if attempt == LLAMA_PARSE_RETRIES:
+                raise ParseError(f"{method} {url} failed: {e}")
+            reason = str(e) or type(e).__name__
+        delay = _backoff(attempt, 1.0, 30.0)
+        if time.monotonic() + delay > deadline:
+            raise ParseError(f"Deadline exceeded while retrying {method} {url}")
+        logging.info(f"Transient LlamaParse error ({reason}); retrying in {delay:.1f}s.")
+        await asyncio.sleep(delay)
 
-def process_pdf_with_llamaparser(pdf_path: str) -> str:
+
+@traced("llamaparse.upload")
+async def upload_pdf(client: httpx.AsyncClient, pdf_path: str, deadline: float) -> str:
     """
-    Sends the combined PDF to the LlamaParser API and saves the structured output as Markdown.
+    Uploads a PDF to LlamaParse and returns the job ID.
+    """
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_bytes = pdf_file.read()
+    current_span().set(bytes=len(pdf_bytes))
+    response = await _request(
+        client, "POST", f"{LLAMA_PARSE_BASE_URL}/upload", deadline,
+        files={"file": ("file.pdf", pdf_bytes, "application/pdf")},
+    )
+    if response.status_code != 200:
+        raise ParseError(f"Error from LlamaParser: {response.status_code} - {response.text}")
+    job_id = response.json().get("id")
+    if not job_id:
+        raise ParseError("No job ID received from LlamaParser.")
+    return job_id
+
+
+@traced("llamaparse.poll")
+async def wait_for_result(client: httpx.AsyncClient, job_id: str, deadline: float) -> str:
+    """
+    Polls a job with exponential backoff and jitter until it finishes or the deadline passes.
+    Returns the structured Markdown output.
+    """
+    attempt = 0
+    while True:
+        current_span().add(polls=1)
+        response = await _request(client, "GET", f"{LLAMA_PARSE_BASE_URL}/job/{job_id}", deadline)
+        if response.status_code != 200:
+            raise ParseError(f"Error checking job status: {response.status_code} - {response.text}")
+        job_status = response.json().get("status")
+        if job_status == "SUCCESS":
+            result = await _request(client, "GET", f"{LLAMA_PARSE_BASE_URL}/job/{job_id}/result/markdown", deadline)
+            if result.status_code != 200:
+                raise ParseError(f"Error fetching results: {result.status_code} - {result.text}")
+            return result.json().get("markdown", "")
+        if job_status in ("ERROR", "FAILED", "CANCELED"):
+            raise ParseError(f"Job {job_id} failed with status {job_status}.")
+
+        delay = _backoff(attempt, LLAMA_PARSE_POLL_INITIAL, LLAMA_PARSE_POLL_MAX)
+        if time.monotonic() + delay > deadline:
+            raise ParseError(f"Job {job_id} did not finish within {LLAMA_PARSE_TIMEOUT:.0f}s.")
+        logging.info(f"Job {job_id} status: {job_status}. Checking again in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+@traced("llamaparse.parse")
+async def parse_pdf_async(client: httpx.AsyncClient, pdf_path: str, semaphore: asyncio.Semaphore) -> str:
+    """
+    Parses one PDF and writes the Markdown next to it under a name unique to the job.
+    A PDF whose content hash was parsed before is served from the scrape cache without uploading.
     Returns the path to the markdown file, or None if processing fails.
     """
-    headers = {
-        'Authorization': f'Bearer {LLAMA_API_KEY}',
-        'accept': 'application/json',
-        'premium_mode': 'true',
-    }
+    stem = os.path.splitext(pdf_path)[0]
+    cache = get_scrape_cache()
+    cache_key = None
+    if cache:
+        try:
+            content_hash = hash_file(pdf_path)
+            cache_key = f"parse:{content_hash}"
+            entry = cache.lookup(cache_key)
+            cache.record(hit=entry is not None)
+            if entry:
+                md_file = f"{stem}_{content_hash[:12]}.md"
+                cache.copy_to(entry, md_file)
+                logging.info(f"PDF unchanged since last parse, structured data restored from cache: {md_file}")
+                current_span().set(cached=True)
+                return md_file
+        except OSError as e:
+            logging.warning(f"Could not check parse cache for {pdf_path}: {e}")
+
     try:
-        with open(pdf_path, 'rb') as pdf_file:
-            files = {"file": ("file.pdf", pdf_file, "application/pdf")}
-            response = requests.post(
-                "https://api.cloud.llamaindex.ai/api/parsing/upload",
-                headers=headers,
-                files=files
-            )
-        if response.status_code == 200:
-            job_id = response.json().get("id")
-            if job_id:
-                logging.info(f"Job ID: {job_id}")
-                structured_data = check_job_status_and_get_results(job_id)
-                if structured_data:
-                    md_file = os.path.join(os.path.dirname(pdf_path), "structured_data.md")
-                    with open(md_file, "w", encoding="utf-8") as f:
-                        f.write(structured_data)
-                    logging.info(f"Structured data saved to: {md_file}")
-                    return md_file
-                else:
-                    logging.error("Failed to retrieve structured data from LlamaParser.")
-                    return None
-            else:
-                logging.error("No job ID received from LlamaParser.")
-                return None
-        else:
-            logging.error(f"Error from LlamaParser: {response.status_code} - {response.text}")
+        async with semaphore:
+            deadline = time.monotonic() + LLAMA_PARSE_TIMEOUT
+            job_id = await upload_pdf(client, pdf_path, deadline)
+            logging.info(f"Job ID: {job_id}")
+            structured_data = await wait_for_result(client, job_id, deadline)
+        if not structured_data:
+            logging.error("Failed to retrieve structured data from LlamaParser.")
             return None
-    except Exception as e:
+        md_file = f"{stem}_{job_id}.md"
+        with open(md_file, "w", encoding="utf-8") as f:
+            f.write(structured_data)
+        logging.info(f"Structured data saved to: {md_file}")
+        current_span().set(markdown_bytes=len(structured_data.encode("utf-8")))
+        if cache_key:
+            cache.put_bytes(cache_key, structured_data.encode("utf-8"))
+        return md_file
+    except (ParseError, httpx.HTTPError, OSError, ValueError) as e:
         logging.error(f"Exception while processing PDF with LlamaParser: {e}")
         return None
+
+
+async def parse_pdfs_async(pdf_paths: list[str], concurrency: int = LLAMA_PARSE_CONCURRENCY) -> dict:
+    """
+    Parses many PDFs concurrently over one connection pool, at most `concurrency` jobs at a time.
+    Returns {pdf_path: markdown_path or None}.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    timeout = httpx.Timeout(60.0, connect=10.0)
+    async with httpx.AsyncClient(headers=_headers(), timeout=timeout) as client:
+        results = await asyncio.gather(*(parse_pdf_async(client, path, semaphore) for path in pdf_paths))
+    return dict(zip(pdf_paths, results))
+
+
+def parse_pdfs(pdf_paths: list[str], concurrency: int = LLAMA_PARSE_CONCURRENCY) -> dict:
+    """
+    Blocking wrapper around parse_pdfs_async for synchronous callers.
+    """
+    return asyncio.run(parse_pdfs_async(pdf_paths, concurrency))
+
+
+def check_job_status_and_get_results(job_id: str) -> str:
+    """
+    Checks the job status and retrieves results once the job is completed.
+    Returns the structured Markdown output or an empty string if failed.
+    """
+    async def _wait() -> str:
+        async with httpx.AsyncClient(headers=_headers(), timeout=60.0) as client:
+            return await wait_for_result(client, job_id, time.monotonic() + LLAMA_PARSE_TIMEOUT)
+    try:
+        return asyncio.run(_wait())
+    except (ParseError, httpx.HTTPError, ValueError) as e:
+        logging.error(f"Exception while checking job status: {e}")
+        return ""
+
+
+def process_pdf_with_llamaparser(pdf_path: str) -> str:
+    """
+    Sends the combined PDF to the LlamaParser API and saves the structured output as Markdown.
+    Returns the path to the markdown file, or None if processing fails.
+    """
+    return parse_pdfs([pdf_path])[pdf_path]
@@ -0,0 +1,517 @@
+# local_vector_store.py
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+import numpy as np
+from typing import Iterable
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from config import LOCAL_INDEX_DIR, LOCAL_INDEX_QUANTIZATION, LOCAL_INDEX_RESCORE_FACTOR
+
+# Compact the vector file once this fraction of its rows are deleted
+COMPACT_THRESHOLD = 0.3
+QUANTIZATIONS = ("none", "int8", "binary")
+SCAN_BLOCK_ROWS = 65536  # Codes are widened to float32 this many rows at a time
+
+
+def quantize(vectors: np.ndarray, method: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compresses normalized float32 vectors. "int8" scales each vector so its largest component maps
+    to 127 (codes plus one float32 scale per vector); "binary" keeps only the sign bits, packed.
+    Returns (codes, scales); scales is None for binary codes.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method == "binary":
+        return np.packbits(vectors > 0, axis=1), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def code_width(method: str, dim: int) -> int:
+    return (dim + 7) // 8 if method == "binary" else dim
+
+
+def code_bytes(method: str, dim: int) -> int:
+    """
+    Returns the bytes one vector takes in the compressed tier (codes plus scale).
+    """
+    return code_width(method, dim) + (4 if method == "int8" else 0)
+
+
+def coarse_scores(codes: np.ndarray, scales: np.ndarray, method: str, queries: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Approximate cosine scores of float32 queries against compressed codes, scanned in blocks so the
+    widened float32 copy never exceeds SCAN_BLOCK_ROWS rows. Returns a (rows, queries) matrix.
+    """
+    scores = np.empty((len(codes), len(queries)), dtype=np.float32)
+    for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS]
+        if method == "binary":
+            block = np.unpackbits(block, axis=1, count=dim).astype(np.float32) * 2 - 1  # Sign bits -> ±1
+            scores[start:start + len(block)] = block @ queries.T
+        else:
+            scores[start:start + len(block)] = (block.astype(np.float32) @ queries.T) * scales[start:start + len(block), None]
+    return scores
+
+
+def _top_rows(scores: np.ndarray, k: int) -> list[list[int]]:
+    # Best-first row indices of the k highest scores in each column
+    top = np.argpartition(-scores, k - 1, axis=0)[:k]
+    return [[int(r) for r in top[:, q][np.argsort(-scores[top[:, q], q])]] for q in range(scores.shape[1])]
+
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """
+    Evaluates a Pinecone-style metadata filter, e.g. {"source": {"$in": [...]}, "page": {"$gte": 2}}.
+    Supports $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $and and $or; a bare value means $eq.
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, arg in condition.items():
+            try:
+                ok = {
+                    "$eq": lambda: value == arg,
+                    "$ne": lambda: value != arg,
+                    "$in": lambda: value in arg,
+                    "$nin": lambda: value not in arg,
+                    "$gt": lambda: value is not None and value > arg,
+                    "$gte": lambda: value is not None and value >= arg,
+                    "$lt": lambda: value is not None and value < arg,
+                    "$lte": lambda: value is not None and value <= arg,
+                }[op]()
+            except KeyError:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            except TypeError:
+                ok = False
+            if not ok:
+                return False
+    return True
+
+
+def search_rows(vectors: np.ndarray, queries: np.ndarray, k: int, mask: np.ndarray, codes: np.ndarray = None,
+                scales: np.ndarray = None, method: str = "none", rescore_factor: int = 1) -> list[list[tuple[int, float]]]:
+    """
+    Finds the k nearest rows per normalized query among the rows in `mask`: an exact scan of `vectors`,
+    or with codes a coarse scan of the codes followed by exact rescoring of the top rescore_factor * k
+    candidates (only those rows of `vectors` are read). Returns best-first (row, cosine score) lists.
+    """
+    valid = int(mask.sum())
+    k = min(k, valid)
+    if k <= 0:
+        return [[] for _ in range(len(queries))]
+    if codes is None:
+        scores = vectors @ queries.T  # (rows, queries)
+        scores[~mask] = -np.inf
+        return [[(row, float(scores[row, q])) for row in rows] for q, rows in enumerate(_top_rows(scores, k))]
+
+    coarse = coarse_scores(codes, scales, method, queries, vectors.shape[1])
+    coarse[~mask] = -np.inf
+    candidates = _top_rows(coarse, min(valid, k * max(1, rescore_factor)))
+    union = sorted({row for rows in candidates for row in rows})
+    exact = np.asarray(vectors[union]) @ queries.T
+    position = {row: n for n, row in enumerate(union)}
+    hits = []
+    for q, rows in enumerate(candidates):
+        rescored = exact[[position[row] for row in rows], q]
+        hits.append([(rows[n], float(rescored[n])) for n in np.argsort(-rescored)[:k]])
+    return hits
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index persisted under `path`: normalized float32 vectors in a
+    memory-mapped file (`vectors.f32`) and documents/metadata in SQLite (`docs.db`).
+    Search is an exact cosine scan done as one NumPy matrix product, or, with `quantization`
+    "int8" or "binary", a coarse scan over compressed codes held in RAM (`codes.i8` / `codes.bin`)
+    followed by exact float32 rescoring of the top `rescore_factor * k` candidates read from the
+    memory-mapped vectors. Rows written by other processes are picked up automatically on the next call.
+    """
+
+    def __init__(self, embedding: Embeddings, path: str = LOCAL_INDEX_DIR, quantization: str = LOCAL_INDEX_QUANTIZATION,
+                 rescore_factor: int = LOCAL_INDEX_RESCORE_FACTOR):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}.")
+        self._embedding = embedding
+        self.path = path
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._codes_path = os.path.join(path, "codes.bin" if quantization == "binary" else "codes.i8")
+        self._scales_path = os.path.join(path, "scales.f32")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(path, "docs.db"), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs (row INTEGER PRIMARY KEY, id TEXT NOT NULL, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, namespace TEXT NOT NULL DEFAULT '', alive INTEGER NOT NULL DEFAULT 1)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_id ON docs (id, alive)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._generation = None
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # Loading / persistence
+
+    def _meta(self, key: str, default: str = None) -> str:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _load(self) -> None:
+        """
+        (Re)loads the in-memory view: the memory-mapped vectors plus metadata of every row.
+        """
+        with self._lock:
+            self._generation = self._meta("generation", "0")
+            self.dim = int(self._meta("dim", "0"))
+            rows = self._db.execute("SELECT row, id, metadata, namespace, alive FROM docs ORDER BY row").fetchall()
+            count = rows[-1][0] + 1 if rows else 0
+            self._ids = [None] * count
+            self._metadata = [{}] * count
+            self._namespaces = [""] * count
+            self._alive = np.zeros(count, dtype=bool)
+            for row, doc_id, metadata, namespace, alive in rows:
+                self._ids[row] = doc_id
+                self._metadata[row] = json.loads(metadata)
+                self._namespaces[row] = namespace
+                self._alive[row] = bool(alive)
+            if count and self.dim:
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+            else:
+                self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+            self._codes, self._scales = None, None
+            if self.quantization != "none" and count and self.dim:
+                self._sync_codes()
+                width = code_width(self.quantization, self.dim)
+                dtype = np.uint8 if self.quantization == "binary" else np.int8
+                self._codes = np.fromfile(self._codes_path, dtype=dtype, count=count * width).reshape(count, width)
+                if self.quantization == "int8":
+                    self._scales = np.fromfile(self._scales_path, dtype=np.float32, count=count)
+
+    def _code_rows(self, dim: int = None) -> int:
+        # Rows present in the code files (both files must have them for int8)
+        if not os.path.exists(self._codes_path):
+            return 0
+        rows = os.path.getsize(self._codes_path) // code_width(self.quantization, dim or self.dim)
+        if self.quantization == "int8":
+            rows = min(rows, os.path.getsize(self._scales_path) // 4 if os.path.exists(self._scales_path) else 0)
+        return rows
+
+    def _write_codes(self, start: int, vectors: np.ndarray) -> None:
+        # Writes codes for rows start.. at their offsets, dropping anything past them (like the vector file)
+        codes, scales = quantize(vectors, self.quantization)
+        with open(self._codes_path, "ab") as file:
+            file.truncate(start * codes.shape[1])
+            file.write(codes.tobytes())
+        if scales is not None:
+            with open(self._scales_path, "ab") as file:
+                file.truncate(start * 4)
+                file.write(scales.tobytes())
+
+    def _sync_codes(self) -> None:
+        """
+        Brings the code files in line with the vector file: after quantization is switched on, after a
+        compaction, or after another process without quantization appended rows. Only missing rows are encoded.
+        """
+        if self._code_rows() == len(self._vectors):
+            return
+        own_transaction = not self._db.in_transaction
+        if own_transaction:
+            self._db.execute("BEGIN IMMEDIATE")  # No writer may append while codes are rebuilt
+        try:
+            # Re-read the row count under the lock: a writer may have committed since this view was loaded
+            count = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM docs").fetchone()[0]
+            vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+            start = min(self._code_rows(), count)
+            for block in range(start, count, SCAN_BLOCK_ROWS) or [count]:  # [count] only truncates
+                self._write_codes(block, np.asarray(vectors[block:min(count, block + SCAN_BLOCK_ROWS)]))
+            if own_transaction:
+                self._db.execute("COMMIT")
+        except Exception:
+            if own_transaction:
+                self._db.execute("ROLLBACK")
+            raise
+        logging.info(f"Encoded {count - start} vectors as {self.quantization} codes.")
+
+    def _refresh(self) -> None:
+        # Another process (or thread) may have written since we loaded
+        if self._meta("generation", "0") != self._generation:
+            self._load()
+
+    def _bump_generation(self) -> None:
+        generation = int(self._meta("generation", "0")) + 1
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+
+    # Writes
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        vectors,
+        metadatas: list[dict] = None,
+        ids: list[str] = None,
+        namespace: str = "",
+    ) -> list[str]:
+        """
+        Adds precomputed vectors. Existing documents with the same IDs are replaced.
+        Returns the IDs of the added documents.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return []
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")  # Serializes writers across processes
+            try:
+                dim = int(self._meta("dim", "0"))
+                if not dim:
+                    dim = vectors.shape[1]
+                    self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(dim),))
+                elif vectors.shape[1] != dim:
+                    raise ValueError(f"Expected {dim}-dimensional vectors, got {vectors.shape[1]}.")
+                self._db.executemany("UPDATE docs SET alive = 0 WHERE id = ? AND alive = 1", [(i,) for i in ids])
+                start = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM docs").fetchone()[0]
+                # Append at the row offset recorded in SQLite, dropping any bytes left by a crashed writer
+                with open(self._vectors_path, "ab") as file:
+                    file.truncate(start * dim * 4)
+                    file.write(vectors.tobytes())
+                if self.quantization != "none" and self._code_rows(dim) == start:
+                    self._write_codes(start, vectors)  # Otherwise the next load re-syncs the codes
+                self._db.executemany(
+                    "INSERT INTO docs (row, id, text, metadata, namespace) VALUES (?, ?, ?, ?, ?)",
+                    [(start + n, ids[n], texts[n], json.dumps(metadatas[n]), namespace) for n in range(len(texts))]
+                )
+                self._bump_generation()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._load()
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: list[dict] = None, ids: list[str] = None, **kwargs) -> list[str]:
+        texts = list(texts)
+        vectors = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, vectors, metadatas, ids, kwargs.get("namespace") or "")
+
+    def delete(self, ids: list[str] = None, delete_all: bool = None, namespace: str = None,
+               filter: dict = None, **kwargs) -> bool:
+        """
+        Deletes by IDs, by metadata filter, or everything (optionally within one namespace).
+        """
+        with self._lock:
+            self._refresh()
+            if delete_all:
+                rows = [r for r in range(len(self._ids)) if namespace is None or self._namespaces[r] == namespace]
+            elif filter:
+                rows = [r for r in np.flatnonzero(self._alive) if matches_filter(self._metadata[r], filter)]
+            elif ids:
+                wanted = set(ids)
+                rows = [r for r in np.flatnonzero(self._alive) if self._ids[r] in wanted]
+            else:
+                return False
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany("UPDATE docs SET alive = 0 WHERE row = ?", [(int(r),) for r in rows])
+            self._bump_generation()
+            self._db.execute("COMMIT")
+            self._load()
+            if len(self._alive) and 1 - self._alive.mean() > COMPACT_THRESHOLD:
+                self.compact()
+        return True
+
+    def compact(self) -> None:
+        """
+        Rewrites the vector file and table without deleted rows.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._load()
+                rows = self._db.execute(
+                    "SELECT row, id, text, metadata, namespace FROM docs WHERE alive = 1 ORDER BY row"
+                ).fetchall()
+                temp_path = f"{self._vectors_path}.tmp"
+                with open(temp_path, "wb") as file:
+                    for row, *_ in rows:
+                        file.write(np.asarray(self._vectors[row]).tobytes())
+                self._db.execute("DELETE FROM docs")
+                self._db.executemany(
+                    "INSERT INTO docs (row, id, text, metadata, namespace) VALUES (?, ?, ?, ?, ?)",
+                    [(n, *rest) for n, (_, *rest) in enumerate(rows)]
+                )
+                self._vectors = None
+                os.replace(temp_path, self._vectors_path)
+                for name in ("codes.i8", "codes.bin", "scales.f32"):  # Row numbers changed; re-encoded on load
+                    if os.path.exists(os.path.join(self.path, name)):
+                        os.remove(os.path.join(self.path, name))
+                self._bump_generation()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._load()
+            logging.info(f"Compacted local vector index to {len(rows)} rows.")
+
+    # Search
+
+    def _candidate_mask(self, filter: dict = None, namespace: str = None) -> np.ndarray:
+        mask = self._alive.copy()
+        if namespace is not None:
+            mask &= np.array([ns == namespace for ns in self._namespaces], dtype=bool)
+        if filter:
+            for row in np.flatnonzero(mask):
+                if not matches_filter(self._metadata[row], filter):
+                    mask[row] = False
+        return mask
+
+    def _documents(self, rows: list[int]) -> list[Document]:
+        placeholders = ",".join("?" * len(rows))
+        texts = dict(self._db.execute(f"SELECT row, text FROM docs WHERE row IN ({placeholders})", rows).fetchall())
+        return [
+            Document(page_content=texts[row], metadata=self._metadata[row], id=self._ids[row]) for row in rows
+        ]
+
+    def similarity_search_by_vectors_with_score(self, embeddings, k: int = 4, filter: dict = None,
+                                                namespace: str = None) -> list[list[tuple[Document, float]]]:
+        """
+        Batch search: scores every query against the index in one pass and fetches the texts of all
+        hits in one query. Returns one best-first [(document, score)] list per query.
+        """
+        with self._lock:
+            self._refresh()
+            queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+            if not len(self._vectors) or not len(queries):
+                return [[] for _ in range(len(queries))]
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            hits = search_rows(
+                self._vectors, queries, k, self._candidate_mask(filter, namespace),
+                self._codes, self._scales, self.quantization, self.rescore_factor,
+            )
+            rows_needed = sorted({row for rows in hits for row, _ in rows})
+            documents = dict(zip(rows_needed, self._documents(rows_needed))) if rows_needed else {}
+            return [[(documents[row], score) for row, score in rows] for rows in hits]
+
+    def similarity_search_by_vector_with_score(self, embedding: list[float], k: int = 4, filter: dict = None,
+                                               namespace: str = None, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vectors_with_score([embedding], k, filter, namespace)[0]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: dict = None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: dict = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, **kwargs) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2  # Cosine similarity -> [0, 1]
+
+    # Reporting
+
+    def storage_stats(self) -> dict:
+        """
+        Returns rows, dimension, quantization, bytes per vector in the float32 and compressed tiers
+        and the bytes of codes held in RAM.
+        """
+        with self._lock:
+            self._refresh()
+            codes_ram = 0 if self._codes is None else self._codes.nbytes + (0 if self._scales is None else self._scales.nbytes)
+            return {
+                "rows": len(self._vectors),
+                "live_rows": int(self._alive.sum()),
+                "dim": self.dim,
+                "quantization": self.quantization,
+                "float32_bytes_per_vector": self.dim * 4,
+                "code_bytes_per_vector": code_bytes(self.quantization, self.dim) if self.quantization != "none" else None,
+                "codes_ram_bytes": codes_ram,
+            }
+
+    def quantization_report(self, queries=None, k: int = 10, sample: int = 200, methods: tuple = ("int8", "binary"),
+                            rescore_factors: tuple = (1, 2, 4, 10)) -> list[dict]:
+        """
+        Compares each quantization with exact search over the live rows: recall@k after rescoring
+        rescore_factor * k candidates (a factor of 1 measures the coarse pass alone), bytes per vector
+        and mean latency per query.
+        `queries` are query embeddings; by default `sample` stored vectors are used.
+        Returns one row per (method, rescore_factor), plus the exact float32 baseline.
+        """
+        with self._lock:
+            self._refresh()
+            mask = self._alive.copy()
+            if not mask.any():
+                return []
+            if queries is None:
+                rng = np.random.default_rng(0)
+                picks = rng.choice(np.flatnonzero(mask), size=min(sample, int(mask.sum())), replace=False)
+                queries = np.asarray(self._vectors[np.sort(picks)])
+            queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            def timed(**kwargs):
+                start = time.perf_counter()
+                hits = search_rows(self._vectors, queries, k, mask, **kwargs)
+                return hits, (time.perf_counter() - start) * 1000 / len(queries)
+
+            exact, exact_ms = timed()
+            truth = [{row for row, _ in hits} for hits in exact]
+            rows = [{"method": "float32", "rescore_factor": None, "recall@k": 1.0,
+                     "bytes_per_vector": self.dim * 4, "ms_per_query": round(exact_ms, 3)}]
+            for method in methods:
+                codes, scales = [], []
+                for start in range(0, len(self._vectors), SCAN_BLOCK_ROWS):
+                    block_codes, block_scales = quantize(self._vectors[start:start + SCAN_BLOCK_ROWS], method)
+                    codes.append(block_codes)
+                    scales.append(block_scales)
+                codes = np.vstack(codes)
+                scales = None if method == "binary" else np.concatenate(scales)
+                for factor in rescore_factors:
+                    hits, ms = timed(codes=codes, scales=scales, method=method, rescore_factor=factor)
+                    recall = np.mean([len(truth[q] & {row for row, _ in hits[q]}) / len(truth[q]) for q in range(len(hits))])
+                    rows.append({"method": method, "rescore_factor": factor, "recall@k": round(float(recall), 4),
+                                 "bytes_per_vector": code_bytes(method, self.dim), "ms_per_query": round(ms, 3)})
+            return rows
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: list[dict] = None,
+                   ids: list[str] = None, path: str = LOCAL_INDEX_DIR, **kwargs) -> "LocalVectorStore":
+        store = cls(embedding, path=path)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+if __name__ == "__main__":
+    # Usage: python local_vector_store.py [k] [queries.txt]  (recall@k and size of int8/binary codes vs float32)
+    from vector_store_setup import get_embeddings
+
+    store = LocalVectorStore(get_embeddings())
+    report_k = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    query_vectors = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as file:
+            query_vectors = get_embeddings().embed_array([line.strip() for line in file if line.strip()])
+    print(json.dumps({"index": store.storage_stats(), "k": report_k,
+                      "results": store.quantization_report(query_vectors, k=report_k)}, indent=2))
@@ -1,14 +1,16 @@
-import os
+import json
 import logging
-import time
-import shutil
 import streamlit as st
 import pandas as pd
-from scraper import scrape_page, combine_text_images_pdfs
-from llama_parser import process_pdf_with_llamaparser
-from document_processor import load_and_process_document
-from rag import rag_answer
-from vector_store_setup import vector_store  # Access Pinecone vector store
+from config import CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, JOB_QUEUE_AUTOSTART, METRICS_PORT, PINECONE_NAMESPACE_MODE, missing_settings
+from job_queue import get_job_queue, ensure_workers
+from scrape_cache import get_scrape_cache
+from index_manifest import get_index_manifest
+from rag import rag_answer_stream
+from vector_store_setup import delete_all_vectors, warm_up, init_status  # Access Pinecone vector store
+from document_processor import remove_site
+from index_writer import namespace_for
+from telemetry import run_breakdown, start_metrics_server
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -17,100 +19,145 @@ st.title("🌍GlobalApply AI Scraper⛏️📃")
 
 def delete_vector_db():
     """
-    Deletes all vectors from the Pinecone index.
+    Deletes all vectors from the Pinecone index and forgets what each source had indexed.
     If the namespace is not found (i.e., already cleared), it handles the error gracefully.
     """
     try:
-        # Specify the default namespace explicitly (if using default, use "")
-        vector_store.delete(delete_all=True, namespace="")
+        # Every namespace (one per site in site mode)
+        delete_all_vectors()
+        get_index_manifest().clear()
         st.success("Vector database cleared successfully!")
         logging.info("Vector database successfully cleared.")
     except Exception as e:
         error_str = str(e)
         if "Namespace not found" in error_str:
+            get_index_manifest().clear()
             st.warning("Vector database is already cleared (namespace not found).")
             logging.info("Vector database already cleared (namespace not found).")
         else:
             logging.error(f"Error clearing vector database: {e}")
             st.error(f"Error clearing vector database: {e}")
 
+def format_timings(timings: dict) -> str:
+    """Formats per-query latency figures for display under an answer."""
+    first_token = timings.get("time_to_first_token")
+    first_token_text = f"{first_token:.2f}s" if first_token is not None else "n/a"
+    cached_text = " · cached" if timings.get("cached") else ""
+    retrieval_text = f"Retrieval: {timings['retrieval']:.2f}s · " if "retrieval" in timings else ""
+    return f"{retrieval_text}Time to first token: {first_token_text} · Total: {timings.get('total', 0):.2f}s{cached_text}"
+
+
+def show_startup_status():
+    """Shows per-component initialization times while services warm up in the background."""
+    with st.sidebar.expander("Startup", expanded=False):
+        for name, status in init_status().items():
+            if status["error"]:
+                st.write(f"❌ {name}: {status['error']}")
+            elif status["ready"] and status["seconds"] is not None:
+                st.write(f"✅ {name}: {status['seconds']:.2f}s")
+            else:
+                st.write(f"⏳ {name}: loading…")
+
+def show_breakdown(trace_id: str) -> None:
+    """Shows where a run's time went, one row per pipeline step (slowest first)."""
+    rows = run_breakdown(trace_id)
+    if rows:
+        st.dataframe(pd.DataFrame(rows).round(3), hide_index=True, use_container_width=True)
+    else:
+        st.caption("No spans recorded yet.")
+
+@st.fragment(run_every=2)
+def show_jobs():
+    """Lists recent ingestion jobs with per-stage progress; re-renders itself every two seconds."""
+    queue = get_job_queue()
+    jobs = queue.jobs(limit=5)
+    if not jobs:
+        return
+    st.markdown("#### Ingestion jobs")
+    depth = queue.queue_depth()
+    st.caption("Pending tasks: " + " · ".join(
+        f"{stage} {counts['queued']} queued, {counts['running']} running" for stage, counts in depth.items()
+    ))
+    for job in jobs:
+        progress = job["progress"]
+        pages = sum(n for status, n in progress["crawl"].items() if status != "cancelled")
+        indexed = progress["index"].get("done", 0)
+        failed = sum(counts.get("failed", 0) for counts in progress.values())
+        st.markdown(
+            f"**Job {job['id']}** · {job['status']} · {indexed}/{pages} pages indexed, {failed} failed · "
+            f"{job['pages_per_minute']:.1f} pages/min crawled"
+        )
+        st.progress(min(1.0, (indexed + failed) / pages) if pages else 1.0)
+        st.caption(" · ".join(
+            f"{stage}: " + ", ".join(f"{n} {status}" for status, n in counts.items())
+            for stage, counts in progress.items() if counts
+        ))
+        if job["status"] == "running" and st.button("Cancel", key=f"cancel_job_{job['id']}"):
+            queue.cancel(job["id"])
+        with st.expander("Messages", expanded=False):
+            for task in queue.messages(job["id"]):
+                url = json.loads(task["payload"]).get("url", "")
+                if task["status"] == "done":
+                    st.success(f"[{task['stage']}] {url}: {task['message']}")
+                else:
+                    st.error(f"[{task['stage']}] {url} (after {task['attempts']} attempts): {task['message']}")
+        with st.expander("Timing breakdown", expanded=False):
+            show_breakdown(f"job-{job['id']}")
+    cache = get_scrape_cache()
+    if cache:
+        cache_stats = cache.stats()
+        st.caption(f"Scrape cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.1f} MB")
 
 def main():
+    missing = missing_settings()
+    if missing:
+        st.error(f"Missing API keys ({', '.join(missing)}). Please check your environment configuration.")
+        st.stop()
+    warm_up()  # No-op after the first run in this process
+    start_metrics_server(METRICS_PORT)  # Prometheus /metrics for this and the worker processes
+    if JOB_QUEUE_AUTOSTART:
+        ensure_workers()  # Ingestion runs in worker processes, outliving page refreshes
+    show_startup_status()
+
     # Section 1: URL Input and Scraping inside an expander (dropdown menu)
     with st.expander("Scraping Options", expanded=False):
         urls = []
-        # uploaded_file = st.file_uploader("Upload a CSV file containing URLs", type=["csv"])
+        uploaded_file = st.file_uploader("Upload a CSV file containing URLs", type=["csv"])
         user_url = st.text_input("Or enter a single URL:")
 
         # Toggle options for scraping images and PDFs
         scrape_images_toggle = st.checkbox("Scrape Images", value=True)
         scrape_pdfs_toggle = st.checkbox("Scrape PDFs", value=True)
 
-        # if uploaded_file:
-        #     try:
-        #         df = pd.read_csv(uploaded_file)
-        #         urls = df.iloc[:, 0].dropna().tolist()
-        #     except Exception as e:
-        #         st.error(f"Error reading CSV file: {e}")
-        #         logging.error(f"Error reading CSV file: {e}")
-        # elif user_url:
-        #     urls = [user_url]
-
-
-        # just for testing
-        urls=[user_url] 
-        # just for testing
+        # Optional same-domain link following
+        follow_links_toggle = st.checkbox("Follow same-domain links", value=False)
+        max_depth = CRAWL_MAX_DEPTH
+        max_pages = CRAWL_MAX_PAGES
+        if follow_links_toggle:
+            max_depth = st.number_input("Max link depth", min_value=1, value=CRAWL_MAX_DEPTH)
+            max_pages = st.number_input("Max pages", min_value=1, value=CRAWL_MAX_PAGES)
+
+        if uploaded_file:
+            try:
+                df = pd.read_csv(uploaded_file)
+                urls = df.iloc[:, 0].dropna().tolist()
+            except Exception as e:
+                st.error(f"Error reading CSV file: {e}")
+                logging.error(f"Error reading CSV file: {e}")
+        elif user_url:
+            urls = [user_url]
 
         if urls and st.button("Scrape & Process"):
-            for url in urls:
-                st.write(f"Processing URL: {url}")
-                dir_name = scrape_page(url, scrape_images_toggle, scrape_pdfs_toggle)
-                if dir_name:
-                    # If both toggles are off, simply use the raw text
-                    if not (scrape_images_toggle or scrape_pdfs_toggle):
-                        txt_file = os.path.join(dir_name, "page_content.txt")
-                        md_file = os.path.join(dir_name, "structured_data.md")
-                        try:
-                            with open(txt_file, "r", encoding="utf-8") as f_in, open(md_file, "w", encoding="utf-8") as f_out:
-                                f_out.write(f_in.read())
-                            st.success(f"Structured data saved to: {md_file}")
-                            logging.info(f"Structured data saved to: {md_file}")
-                            message = load_and_process_document(md_file)
-                            st.success(message)
-                            logging.info(message)
-                            if "successfully" in message:
-                                try:
-                                    shutil.rmtree(dir_name)
-                                    logging.info(f"Successfully deleted directory: {dir_name}")
-                                    st.info(f"Cleaned up temporary data directory: {dir_name}")
-                                except Exception as e:
-                                    logging.warning(f"Could not delete directory {dir_name}: {e}")
-                                    st.warning(f"Failed to clean up temporary data directory {dir_name}: {e}")
-                        except Exception as e:
-                            st.error(f"Error creating structured data from text: {e}")
-                    else:
-                        final_pdf = os.path.join(dir_name, "combined_output.pdf")
-                        combined_pdf = combine_text_images_pdfs(dir_name, final_pdf)
-                        st.write(f"Combined PDF created: {combined_pdf}")
-                        logging.info(f"Combined PDF created: {combined_pdf}")
-                        md_file = process_pdf_with_llamaparser(combined_pdf)
-                        if md_file:
-                            st.success(f"Structured data saved to: {md_file}")
-                            message = load_and_process_document(md_file)
-                            st.success(message)
-                            logging.info(message)
-                            if "successfully" in message:
-                                try:
-                                    shutil.rmtree(dir_name)
-                                    logging.info(f"Successfully deleted directory: {dir_name}")
-                                    st.info(f"Cleaned up temporary data directory: {dir_name}")
-                                except Exception as e:
-                                    logging.warning(f"Could not delete directory {dir_name}: {e}")
-                                    st.warning(f"Failed to clean up temporary data directory {dir_name}: {e}")
-                        else:
-                            st.error("Failed to process PDF with LlamaParser.")
-                else:
-                    st.error(f"Failed to scrape {url}")
+            job_id = get_job_queue().submit(urls, {
+                "scrape_images": scrape_images_toggle,
+                "scrape_pdfs": scrape_pdfs_toggle,
+                "follow_links": follow_links_toggle,
+                "max_depth": int(max_depth),
+                "max_pages": int(max_pages),
+            })
+            st.info(f"Job {job_id} queued; progress is shown below and survives page refreshes.")
+
+    show_jobs()
 
     # Section 2: Conversation-like Q&A (mimicking ChatGPT)
     # Initialize session state for conversation and query if not already set.
@@ -120,13 +167,10 @@ def main():
         st.session_state["query_input"] = ""
 
     def process_query():
-        """Callback function to process the question and update conversation."""
+        """Callback function that queues the question; the answer is streamed below."""
         query = st.session_state["query_input"]
         if query:
-            with st.spinner("Generating answer..."):
-                answer = rag_answer(query)
-            # Prepend the new Q&A so that the latest entry appears at the top.
-            st.session_state.conversation = [{"question": query, "answer": answer}] + st.session_state.conversation
+            st.session_state["pending_query"] = query
             st.session_state["query_input"] = ""  # Clear input field
 
     # The text input automatically triggers the callback on submission.
@@ -139,14 +183,39 @@ def main():
     # Move the Delete Vector DB button to the top.
     if st.button("Delete Vector DB"):
         delete_vector_db()
+    if PINECONE_NAMESPACE_MODE == "site":
+        site = st.selectbox("Site namespace", sorted({namespace_for(source) for source in get_index_manifest().sources()}))
+        if site and st.button("Remove site"):
+            try:
+                st.success(f"Removed {remove_site(site)} chunks of {site}.")
+            except Exception as e:
+                st.error(f"Error removing site {site}: {e}")
+                logging.error(f"Error removing site {site}: {e}")
 
     # Display the conversation with the latest question at the top.
-    if st.session_state.conversation:
+    pending_query = st.session_state.pop("pending_query", None)
+    if pending_query or st.session_state.conversation:
         st.markdown("### Conversation")
-        for chat in st.session_state.conversation:
-            st.markdown(f"**Question:** {chat['question']}")
-            st.markdown(f"**Answer:** {chat['answer']}")
-            st.markdown("---")
+    if pending_query:
+        # Stream the new answer token by token as it is generated
+        st.markdown(f"**Question:** {pending_query}")
+        st.markdown("**Answer:**")
+        timings = {}
+        answer = st.write_stream(rag_answer_stream(pending_query, timings))
+        st.caption(format_timings(timings))
+        with st.expander("Timing breakdown", expanded=False):
+            show_breakdown(timings["trace_id"])
+        st.markdown("---")
+        # Prepend the new Q&A so that the latest entry appears at the top.
+        st.session_state.conversation = [
+            {"question": pending_query, "answer": answer, "timings": timings}
+        ] + st.session_state.conversation
+    for chat in st.session_state.conversation[1 if pending_query else 0:]:
+        st.markdown(f"**Question:** {chat['question']}")
+        st.markdown(f"**Answer:** {chat['answer']}")
+        if chat.get("timings"):
+            st.caption(format_timings(chat["timings"]))
+        st.markdown("---")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
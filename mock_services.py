@@ -0,0 +1,264 @@
+# mock_services.py
+import io
+import os
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+
+# Local stand-ins for the fixture website, LlamaParse, Groq and a Pinecone index, so the pipeline can be
+# exercised and benchmarked without network access. Nothing here imports config, so the
+# servers can be started before the pipeline modules read their settings.
+
+WORDS = (
+    "latency throughput cache index vector embedding chunk crawler parser browser queue worker "
+    "retrieval ranking fusion answer model token budget batch stream memory process thread "
+    "network request response header table section heading summary report figure dataset "
+    "pipeline metric trace span checkpoint manifest shard replica cluster region storage"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def _page_html(n: int, rng: random.Random, topic: str, images: list[str], pdfs: list[str], links: list[str]) -> str:
+    sections = []
+    for s in range(4):
+        rows = "".join(
+            f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 1000)}</td><td>{rng.choice(WORDS)}</td></tr>"
+            for _ in range(5)
+        )
+        sections.append(
+            f"<h2>{topic.title()} section {s + 1}</h2>"
+            f"<p>{_paragraph(rng)}</p><p>{_paragraph(rng)}</p>"
+            f"<ul>{''.join(f'<li>{_sentence(rng, 6)}</li>' for _ in range(4))}</ul>"
+            f"<table><tr><th>Name</th><th>Value</th><th>Unit</th></tr>{rows}</table>"
+        )
+    nav = "".join(f'<a href="{link}">{link}</a> ' for link in links)
+    figures = "".join(f'<img src="{src}" alt="figure">' for src in images)
+    downloads = "".join(f'<p><a href="{href}">Download report</a></p>' for href in pdfs)
+    return (
+        f"<!DOCTYPE html><html><head><title>Page {n}: {topic}</title></head><body><nav>{nav}</nav>"
+        f"<main><h1>Page {n}: all about {topic}</h1>{''.join(sections)}{figures}{downloads}</main>"
+        f"<footer>Fixture site footer. Copyright notice.</footer></body></html>"
+    )
+
+
+def _write_image(path: str, rng: random.Random, size: tuple = (640, 480)) -> None:
+    # Noise compresses poorly, so file sizes resemble photos rather than flat fills
+    Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3)).save(path)
+
+
+def _write_pdf(path: str, rng: random.Random, topic: str, pages: int) -> None:
+    c = canvas.Canvas(path, invariant=1)
+    for page in range(pages):
+        c.drawString(50, 800, f"Report on {topic}, page {page + 1}")
+        y = 770
+        while y > 60:
+            c.drawString(50, y, _sentence(rng, 12))
+            y -= 15
+        c.showPage()
+    c.save()
+
+
+def build_fixture_site(root: str, pages: int, images_per_page: int = 2, pdfs_per_page: int = 1,
+                       pdf_pages: int = 3, seed: int = 0) -> list[dict]:
+    """
+    Generates a deterministic static site under `root`: HTML pages with headings, lists and tables,
+    noise PNG images and multi-page text PDFs. The same seed always yields byte-identical files.
+    Returns one {"path", "topic"} per page, in order.
+    """
+    rng = random.Random(seed)
+    for sub in ("pages", "images", "docs"):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+    site = []
+    for n in range(pages):
+        topic = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {n}"
+        images = [f"/images/img_{n}_{i}.png" for i in range(images_per_page)]
+        pdfs = [f"/docs/doc_{n}_{i}.pdf" for i in range(pdfs_per_page)]
+        links = [f"/pages/page_{(n + step) % pages}.html" for step in (1, 2)]
+        for src in images:
+            _write_image(os.path.join(root, src.lstrip("/")), rng)
+        for href in pdfs:
+            _write_pdf(os.path.join(root, href.lstrip("/")), rng, topic, pdf_pages)
+        path = f"/pages/page_{n}.html"
+        with open(os.path.join(root, path.lstrip("/")), "w", encoding="utf-8") as file:
+            file.write(_page_html(n, rng, topic, images, pdfs, links))
+        site.append({"path": path, "topic": topic})
+    return site
+
+
+def _serve(handler, name: str, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, name=f"mock-{name}", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+def serve_fixture_site(root: str, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Serves `root` as a static site (with Last-Modified, so revalidation works) from a daemon thread.
+    Returns (server, base_url).
+    """
+    class FixtureHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    return _serve(partial(FixtureHandler, directory=root), "site", port)
+
+
+def _pdf_markdown(upload: bytes) -> str:
+    # Pull the PDF out of the multipart body and return its text as one section per page
+    start, end = upload.find(b"%PDF"), upload.rfind(b"%%EOF")
+    if start < 0 or end < 0:
+        return ""
+    try:
+        reader = PdfReader(io.BytesIO(upload[start:end + 5]))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        logging.warning(f"Mock LlamaParse could not read upload: {e}")
+        return ""
+    return "\n\n".join(f"## Page {n + 1}\n\n{text.strip()}" for n, text in enumerate(pages) if text.strip())
+
+
+def serve_mock_llamaparse(processing_seconds: float = 0.2, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Serves the LlamaParse endpoints llama_parser uses (upload, job status, Markdown result).
+    Jobs report PENDING until `processing_seconds` have passed; the result is the PDF's text layer.
+    Returns (server, base_url) for LLAMA_PARSE_BASE_URL.
+    """
+    jobs = {}  # job_id -> (ready_at, markdown)
+
+    class LlamaParseHandler(_QuietHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/upload":
+                return self._json(404, {"detail": "Not found"})
+            job_id = uuid.uuid4().hex
+            jobs[job_id] = (time.monotonic() + processing_seconds, _pdf_markdown(self._body()))
+            self._json(200, {"id": job_id, "status": "PENDING"})
+
+        def do_GET(self):
+            match = re.fullmatch(r"/job/([0-9a-f]+)(/result/markdown)?", self.path)
+            if not match or match.group(1) not in jobs:
+                return self._json(404, {"detail": "Job not found"})
+            ready_at, markdown = jobs[match.group(1)]
+            done = time.monotonic() >= ready_at
+            if match.group(2):
+                return self._json(200, {"markdown": markdown}) if done else self._json(400, {"detail": "Job not ready"})
+            self._json(200, {"id": match.group(1), "status": "SUCCESS" if done else "PENDING"})
+
+    return _serve(LlamaParseHandler, "llamaparse", port)
+
+
+def serve_mock_groq(tokens_per_second: float = 0, answer_words: int = 60, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Serves Groq's OpenAI-compatible chat completions endpoint, streaming or not. Answers are
+    `answer_words` words drawn from the prompt; tokens_per_second > 0 paces them like a real model.
+    Returns (server, base_url) for GROQ_BASE_URL.
+    """
+    class GroqHandler(_QuietHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") != "/openai/v1/chat/completions":
+                return self._json(404, {"error": {"message": "Not found"}})
+            request = json.loads(self._body() or b"{}")
+            prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+            words = (prompt.split() or WORDS)[-answer_words:]
+            tokens = [word + " " for word in words]
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": request.get("model", "mock")}
+            usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(tokens),
+                     "total_tokens": len(prompt.split()) + len(tokens)}
+            if not request.get("stream"):
+                if tokens_per_second:
+                    time.sleep(len(tokens) / tokens_per_second)
+                return self._json(200, {
+                    **base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                 "finish_reason": "stop", "logprobs": None}],
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")  # Streamed without a length; close to end it
+            self.end_headers()
+            self.close_connection = True
+            for n, token in enumerate(tokens + [None]):
+                if tokens_per_second and token is not None:
+                    time.sleep(1 / tokens_per_second)
+                chunk = {**base, "object": "chat.completion.chunk", "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": token} if n == 0 else ({"content": token} if token else {}),
+                    "finish_reason": None if token is not None else "stop", "logprobs": None,
+                }]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return _serve(GroqHandler, "groq", port)
+
+
+def serve_mock_pinecone(throttle_rate: float = 0.0, port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Serves the Pinecone data-plane endpoints index_writer uses (upsert, delete, describe_index_stats),
+    keeping vector IDs per namespace in memory. A `throttle_rate` fraction of writes is answered with 429.
+    Returns (server, base_url) for PINECONE_INDEX_HOST.
+    """
+    namespaces = {}  # namespace -> set of vector IDs
+    lock = threading.Lock()
+
+    class PineconeHandler(_QuietHandler):
+        def do_POST(self):
+            request = json.loads(self._body() or b"{}")
+            path = self.path.rstrip("/")
+            if path in ("/vectors/upsert", "/vectors/delete") and random.random() < throttle_rate:
+                return self._json(429, {"code": 8, "message": "Too many requests"})
+            namespace = request.get("namespace", "")
+            with lock:
+                if path == "/vectors/upsert":
+                    vectors = request.get("vectors", [])
+                    namespaces.setdefault(namespace, set()).update(vector["id"] for vector in vectors)
+                    return self._json(200, {"upsertedCount": len(vectors)})
+                if path == "/vectors/delete":
+                    if request.get("deleteAll"):
+                        namespaces.pop(namespace, None)
+                    else:
+                        namespaces.get(namespace, set()).difference_update(request.get("ids", []))
+                    return self._json(200, {})
+                if path == "/describe_index_stats":
+                    return self._json(200, {
+                        "namespaces": {name: {"vectorCount": len(ids)} for name, ids in namespaces.items()},
+                        "totalVectorCount": sum(len(ids) for ids in namespaces.values()),
+                    })
+            self._json(404, {"code": 5, "message": "Not found"})
+
+    return _serve(PineconeHandler, "pinecone", port)
@@ -0,0 +1,150 @@
+# pdf_extractor.py
+import os
+import sys
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader, PdfWriter
+from langchain_core.documents import Document
+from config import PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK, PDF_LLAMAPARSE_FALLBACK
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory in MB of this process plus its largest finished child
+    (e.g. a pool worker), or None where the platform doesn't report it.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (own + children) / scale
+
+
+@dataclass
+class ExtractionStats:
+    pages: int = 0
+    empty_pages: list = field(default_factory=list)
+    seconds: float = 0.0
+    peak_rss_mb: float = None
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+
+def _table_markdown(rows: list) -> str:
+    rows = [[(cell or "").replace("\n", " ").replace("|", "\\|").strip() for cell in row] for row in rows if row]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + " --- |" * width]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> list[tuple[int, str]]:
+    """
+    Extracts pages [start, end) (0-based) as Markdown: the text outside tables followed by
+    each table as a Markdown table. Runs in a worker process.
+    """
+    import pdfplumber
+
+    results = []
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for offset, page in enumerate(pdf.pages):
+            tables = page.find_tables()
+            boxes = [table.bbox for table in tables]
+
+            def outside_tables(obj) -> bool:
+                return not any(
+                    obj.get("x0", 0) >= x0 and obj.get("x1", 0) <= x1 and obj.get("top", 0) >= top and obj.get("bottom", 0) <= bottom
+                    for x0, top, x1, bottom in boxes
+                )
+
+            text = (page.filter(outside_tables) if boxes else page).extract_text() or ""
+            parts = [text.strip()] + [_table_markdown(table.extract()) for table in tables]
+            results.append((start + offset, "\n\n".join(part for part in parts if part)))
+            page.flush_cache()  # Keep worker memory flat on long documents
+    return results
+
+
+def iter_pdf_pages(pdf_path: str, stats: ExtractionStats = None, max_workers: int = PDF_EXTRACT_WORKERS,
+                   pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[tuple[int, str]]:
+    """
+    Extracts a PDF locally, fanning page ranges out over a process pool, and yields
+    (page_number, markdown) in page order as soon as each range is done.
+    Only a bounded number of ranges is in flight, so memory does not grow with page count.
+    """
+    stats = stats if stats is not None else ExtractionStats()
+    start_time = time.perf_counter()
+    page_count = len(PdfReader(pdf_path).pages)
+    ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        in_flight = []
+        next_range = 0
+        while in_flight or next_range < len(ranges):
+            while next_range < len(ranges) and len(in_flight) < max_workers * 2:
+                start, end = ranges[next_range]
+                in_flight.append(pool.submit(_extract_page_range, pdf_path, start, end))
+                next_range += 1
+            for page_number, markdown in in_flight.pop(0).result():
+                stats.pages += 1
+                if not markdown.strip():
+                    stats.empty_pages.append(page_number)
+                yield page_number, markdown
+    stats.seconds = time.perf_counter() - start_time
+    stats.peak_rss_mb = peak_rss_mb()
+    logging.info(
+        f"Extracted {stats.pages} pages from {pdf_path} in {stats.seconds:.2f}s "
+        f"({stats.pages_per_sec:.1f} pages/sec, {len(stats.empty_pages)} without text, "
+        f"peak RSS {stats.peak_rss_mb or 0:.0f} MB)"
+    )
+
+
+def _parse_pages_remotely(pdf_path: str, page_numbers: list[int]) -> str:
+    """
+    Sends only the given pages to LlamaParse (e.g. scanned pages without a text layer).
+    Returns the Markdown, or an empty string on failure.
+    """
+    from llama_parser import process_pdf_with_llamaparser
+
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number])
+    subset_path = f"{os.path.splitext(pdf_path)[0]}_fallback_pages.pdf"  # Skipped by scraper.list_assets
+    with open(subset_path, "wb") as file:
+        writer.write(file)
+    md_file = process_pdf_with_llamaparser(subset_path)
+    if not md_file:
+        return ""
+    with open(md_file, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def iter_pdf_documents(pdf_path: str, source: str, stats: ExtractionStats = None,
+                       fallback: bool = PDF_LLAMAPARSE_FALLBACK) -> Iterator[Document]:
+    """
+    Yields one Document per PDF page with text, ready for chunking. Pages that yield no
+    text are sent to LlamaParse afterwards when `fallback` is enabled.
+    """
+    stats = stats if stats is not None else ExtractionStats()
+    for page_number, markdown in iter_pdf_pages(pdf_path, stats):
+        if markdown.strip():
+            yield Document(page_content=markdown, metadata={"source": source, "page": page_number + 1})
+    if fallback and stats.empty_pages:
+        logging.info(f"Sending {len(stats.empty_pages)} pages without text to LlamaParse: {pdf_path}")
+        markdown = _parse_pages_remotely(pdf_path, stats.empty_pages)
+        if markdown.strip():
+            yield Document(page_content=markdown, metadata={"source": source, "pages": "ocr-fallback"})
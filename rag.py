@@ -1,46 +1,290 @@
+import re
+import sys
+import json
+import time
 import logging
-from vector_store_setup import vector_store, sequence
+import threading
+import numpy as np
+from typing import Iterator
+from dataclasses import dataclass, field, asdict
+from vector_store_setup import get_sequence, get_embeddings, get_llm
+from answer_cache import AnswerCache
+from retrieval import retrieve, retrieve_batch, map_in_threads
+from chunker import count_tokens
+from telemetry import span, trace, new_trace_id
+from config import (
+    ANSWER_CACHE_ENABLED,
+    RAG_BATCH_CONCURRENCY,
+    GROQ_REQUESTS_PER_MINUTE,
+    GROQ_TOKENS_PER_MINUTE,
+    RAG_ANSWER_TOKENS,
+    RAG_MULTI_QUERY_COUNT,
+)
 
-def retrieve_documents(query: str) -> str:
+NO_CONTEXT_ANSWER = "I'm sorry, but I couldn't find relevant information in the database."
+ERROR_ANSWER = "An error occurred while generating the answer. Please try again."
+MULTI_QUERY_PROMPT = (
+    "Write {n} different search queries that would help answer the question below, "
+    "one per line, with no numbering or other text.\n\nQuestion: {question}"
+)
+
+# Shared across Streamlit sessions so a colleague's question answers yours
+answer_cache = AnswerCache(get_embeddings()) if ANSWER_CACHE_ENABLED else None
+
+def retrieve_documents(query: str, timings: dict = None) -> str:
     """
-    Retrieves relevant documents from the Pinecone vector store based on the query.
+    Retrieves relevant documents with hybrid vector + keyword search, packed into the context token budget.
+    If `timings` is given, the retrieval time in seconds is stored under `retrieval`.
     Returns the combined content of the retrieved documents.
     """
     try:
-        results = vector_store.similarity_search(query, k=10)
-        if not results:
+        result = retrieve(query)
+        if timings is not None:
+            timings["retrieval"] = result.timings["total"]
+        if not result.documents:
             logging.info(f"No relevant context found for query: {query}")
             return None  # Return None for better handling in rag_answer()
 
-        return "\n\n".join([result.page_content for result in results])
+        return result.context
     except Exception as e:
         error_msg = f"Error retrieving documents: {e}"
         logging.error(error_msg)
         return None  # Ensure None is returned instead of an error message
 
+def _content(result) -> str:
+    """
+    Extracts the text from an LLM result or streamed chunk, handling different return types.
+    """
+    if hasattr(result, "content"):
+        return result.content
+    elif isinstance(result, dict) and "content" in result:
+        return result["content"]
+    elif isinstance(result, str):
+        return result
+    else:
+        logging.warning(f"Unexpected response format: {result}")
+        return str(result)
+
 def rag_answer(query: str) -> str:
     """
     Generates an answer using the RAG pipeline by querying Pinecone.
+    Repeated and near-duplicate questions are answered from the answer cache.
     Returns the generated answer or an error message.
     """
+    start = time.perf_counter()
     try:
-        context = retrieve_documents(query)
-        if not context:
-            return "I'm sorry, but I couldn't find relevant information in the database."
-
-        result = sequence.invoke({"question": query, "context": context})
-
-        # Handle different return types properly
-        if hasattr(result, "content"):
-            return result.content
-        elif isinstance(result, dict) and "content" in result:
-            return result["content"]
-        elif isinstance(result, str):
-            return result
-        else:
-            logging.warning(f"Unexpected response format: {result}")
-            return str(result)
+        with trace(new_trace_id("answer")), span("rag.answer") as answer_span:
+            cached = answer_cache.get(query) if answer_cache else None
+            answer_span.set(cached=cached is not None)
+            if cached is not None:
+                return cached
+
+            context = retrieve_documents(query)
+            if not context:
+                return NO_CONTEXT_ANSWER
+
+            with span("rag.generate"):
+                result = get_sequence().invoke({"question": query, "context": context})
+        answer = _content(result)
+        if answer_cache:
+            answer_cache.put(query, answer)
+        return answer
     except Exception as e:
         error_msg = f"Error generating answer: {e}"
         logging.error(error_msg)
-        return "An error occurred while generating the answer. Please try again."
+        return ERROR_ANSWER
+    finally:
+        logging.info(f"Answered query in {time.perf_counter() - start:.2f}s")
+
+def rag_answer_stream(query: str, timings: dict = None) -> Iterator[str]:
+    """
+    Streaming variant of rag_answer: yields the answer text piece by piece as tokens arrive.
+    If `timings` is given it is filled with `retrieval`, `time_to_first_token`, `total` (seconds), `cached`
+    and the `trace_id` under which the answer's spans were recorded.
+    """
+    timings = {} if timings is None else timings
+    timings["trace_id"] = new_trace_id("answer")
+    start = time.perf_counter()
+    try:
+        with trace(timings["trace_id"]), span("rag.answer") as answer_span:
+            cached = answer_cache.get(query) if answer_cache else None
+            timings["cached"] = cached is not None
+            answer_span.set(cached=timings["cached"])
+            if cached is not None:
+                timings["time_to_first_token"] = time.perf_counter() - start
+                yield cached
+                return
+
+            context = retrieve_documents(query, timings)
+            if not context:
+                yield NO_CONTEXT_ANSWER
+                return
+
+            parts = []
+            with span("rag.generate") as generate_span:
+                for chunk in get_sequence().stream({"question": query, "context": context}):
+                    text = _content(chunk)
+                    if text:
+                        if "time_to_first_token" not in timings:
+                            timings["time_to_first_token"] = time.perf_counter() - start
+                            generate_span.set(time_to_first_token=timings["time_to_first_token"])
+                        parts.append(text)
+                        yield text
+                generate_span.set(chunks=len(parts))
+        if answer_cache and parts:
+            answer_cache.put(query, "".join(parts))
+    except Exception as e:
+        error_msg = f"Error generating answer: {e}"
+        logging.error(error_msg)
+        yield ERROR_ANSWER
+    finally:
+        timings["total"] = time.perf_counter() - start
+        logging.info(
+            f"Streamed answer: first token after {timings.get('time_to_first_token', float('nan')):.2f}s, "
+            f"total {timings['total']:.2f}s"
+        )
+
+@dataclass
+class BatchAnswer:
+    question: str
+    answer: str = None
+    latency: float = 0.0  # Seconds from the start of the batch until this answer was ready
+    generation: float = 0.0  # Seconds in this question's LLM call, after any rate-limit wait
+    cached: bool = False
+    sub_queries: list[str] = field(default_factory=list)  # Multi-query expansion, if enabled
+    error: str = None
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute (Groq's quotas), shared by the threads of a batch.
+    acquire() blocks until both budgets allow the call; a limit of 0 is not enforced.
+    """
+
+    def __init__(self, requests_per_minute: int = GROQ_REQUESTS_PER_MINUTE, tokens_per_minute: int = GROQ_TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Waits until a call using `tokens` tokens fits both budgets, then spends them.
+        Returns the seconds waited.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                elapsed, self._updated = now - self._updated, now
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+                tokens = min(tokens, self.tokens_per_minute)  # A call larger than the budget waits for a full bucket
+                waits = [0.0]
+                if self.requests_per_minute and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+                if max(waits) == 0:
+                    self._requests -= 1 if self.requests_per_minute else 0
+                    self._tokens -= tokens if self.tokens_per_minute else 0
+                    return time.monotonic() - start
+            time.sleep(max(waits))
+
+def expand_query(question: str, n: int = RAG_MULTI_QUERY_COUNT, limiter: RateLimiter = None) -> list[str]:
+    """
+    Asks the LLM for `n` alternative search queries for a question (multi-query expansion).
+    Returns the sub-queries, or an empty list if the call fails.
+    """
+    prompt = MULTI_QUERY_PROMPT.format(n=n, question=question)
+    try:
+        if limiter:
+            limiter.acquire(count_tokens(prompt) + 25 * n)
+        with span("rag.expand"):
+            text = _content(get_llm().invoke(prompt))
+    except Exception as e:
+        logging.warning(f"Query expansion failed for {question!r}: {e}")
+        return []
+    lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in text.splitlines()]
+    return [line for line in lines if line and line.lower() != question.lower()][:n]
+
+def rag_answer_batch(
+    questions: list[str],
+    multi_query: bool = False,
+    concurrency: int = RAG_BATCH_CONCURRENCY,
+    limiter: RateLimiter = None,
+) -> list[BatchAnswer]:
+    """
+    Answers many questions at once. All questions are embedded in one pass, and those vectors serve
+    both the answer-cache lookup and retrieval. Cached answers are returned directly; the remaining
+    questions (and, with multi_query, their LLM-generated sub-queries) are retrieved as one batch, then up to `concurrency` answers are generated at a time under `limiter`
+    (by default the configured Groq requests/tokens per minute).
+    Returns one BatchAnswer per question, in order, with its latency and any error.
+    """
+    start = time.perf_counter()
+    limiter = limiter or RateLimiter()
+    items = [BatchAnswer(question=question) for question in questions]
+
+    with trace(new_trace_id("batch")), span("rag.batch", questions=len(items), multi_query=multi_query) as batch_span:
+        pending, pending_vectors = [], []
+        vectors = get_embeddings().embed_array([item.question for item in items])
+        for item, vector in zip(items, vectors):
+            cached = answer_cache.get(item.question, vector) if answer_cache else None
+            if cached is None:
+                pending.append(item)
+                pending_vectors.append(vector)
+            else:
+                item.answer, item.cached, item.latency = cached, True, time.perf_counter() - start
+
+        if multi_query and pending:
+            expansions = map_in_threads(lambda item: expand_query(item.question, limiter=limiter), pending, concurrency)
+            for item, sub_queries in zip(pending, expansions):
+                item.sub_queries = sub_queries
+
+        try:
+            results = retrieve_batch(
+                [item.question for item in pending],
+                [item.sub_queries for item in pending] if multi_query else None,
+                query_vectors=np.vstack(pending_vectors) if pending else None,
+            )
+        except Exception as e:
+            logging.error(f"Error retrieving documents for batch: {e}")
+            for item in pending:
+                item.answer, item.error, item.latency = ERROR_ANSWER, str(e), time.perf_counter() - start
+            return items
+
+        def generate(pending_item) -> None:
+            item, result, vector = pending_item
+            try:
+                if not result.documents:
+                    item.answer = NO_CONTEXT_ANSWER
+                    return
+                limiter.acquire(count_tokens(item.question) + result.context_tokens + RAG_ANSWER_TOKENS)
+                generation_start = time.perf_counter()
+                with span("rag.generate"):
+                    item.answer = _content(get_sequence().invoke({"question": item.question, "context": result.context}))
+                item.generation = time.perf_counter() - generation_start
+                if answer_cache:
+                    answer_cache.put(item.question, item.answer, vector)
+            except Exception as e:
+                logging.error(f"Error generating answer for {item.question!r}: {e}")
+                item.answer, item.error = ERROR_ANSWER, str(e)
+            finally:
+                item.latency = time.perf_counter() - start
+
+        map_in_threads(generate, list(zip(pending, results, pending_vectors)), concurrency)
+        batch_span.set(cached=len(items) - len(pending), errors=sum(item.error is not None for item in items))
+
+    logging.info(
+        f"Answered {len(items)} questions in {time.perf_counter() - start:.2f}s "
+        f"({len(items) - len(pending)} cached, {sum(item.error is not None for item in items)} failed)"
+    )
+    return items
+
+if __name__ == "__main__":
+    # Usage: python rag.py questions.txt [--multi-query]  (one question per line; prints JSON lines)
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        batch_questions = [line.strip() for line in file if line.strip()]
+    for batch_answer in rag_answer_batch(batch_questions, multi_query="--multi-query" in sys.argv[2:]):
+        print(json.dumps(asdict(batch_answer)))
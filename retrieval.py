@@ -0,0 +1,288 @@
+# retrieval.py
+import sys
+import json
+import time
+import logging
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.documents import Document
+from vector_store_setup import get_vector_store, get_embeddings
+from index_manifest import chunk_id, get_index_manifest
+from chunker import count_tokens, simhash, hamming_distance
+from index_writer import namespace_for
+from telemetry import traced, current_span
+from config import (
+    RETRIEVAL_VECTOR_K,
+    RETRIEVAL_KEYWORD_K,
+    RETRIEVAL_RRF_K,
+    RETRIEVAL_MMR_ENABLED,
+    RETRIEVAL_MMR_LAMBDA,
+    RETRIEVAL_CONTEXT_TOKENS,
+    RETRIEVAL_BATCH_WORKERS,
+    VECTOR_BACKEND,
+    PINECONE_NAMESPACE_MODE,
+)
+
+
+@dataclass
+class RetrievalResult:
+    documents: list[Document] = field(default_factory=list)  # Packed into the context, best first
+    ranked: list[Document] = field(default_factory=list)  # Fused ranking before packing
+    context_tokens: int = 0
+    timings: dict = field(default_factory=dict)  # Seconds per stage and "total"
+
+    @property
+    def context(self) -> str:
+        return "\n\n".join(doc.page_content for doc in self.documents)
+
+
+def document_id(doc: Document) -> str:
+    return doc.id or chunk_id(doc.metadata.get("source", ""), doc.page_content)
+
+
+def site_namespaces() -> list[str]:
+    """
+    Returns the namespaces Pinecone queries must cover: one per indexed site in site mode, else [""].
+    The local index searches all namespaces at once and needs no fan-out.
+    """
+    if VECTOR_BACKEND == "local" or PINECONE_NAMESPACE_MODE != "site":
+        return [""]
+    return sorted({namespace_for(source) for source in get_index_manifest().sources()}) or [""]
+
+
+@traced("retrieval.vector")
+def vector_search(query_vector: np.ndarray, k: int) -> list[Document]:
+    vector_store = get_vector_store()
+    namespaces = site_namespaces()
+    if len(namespaces) == 1:
+        results = vector_store.similarity_search_by_vector_with_score(query_vector.tolist(), k=k, namespace=namespaces[0] or None)
+        return [doc for doc, _ in results]
+    # One query per site namespace, merged by score
+    per_namespace = map_in_threads(
+        lambda ns: vector_store.similarity_search_by_vector_with_score(query_vector.tolist(), k=k, namespace=ns),
+        namespaces, RETRIEVAL_BATCH_WORKERS,
+    )
+    results = sorted((hit for hits in per_namespace for hit in hits), key=lambda hit: hit[1], reverse=True)
+    current_span().set(namespaces=len(namespaces))
+    return [doc for doc, _ in results[:k]]
+
+
+@traced("retrieval.vector_batch")
+def vector_search_batch(query_vectors: np.ndarray, k: int, workers: int = RETRIEVAL_BATCH_WORKERS) -> list[list[Document]]:
+    """
+    Vector search for many queries: one matrix product on the local index, or concurrent
+    queries against a vector store without a batch API (Pinecone). Returns one ranking per query.
+    """
+    vector_store = get_vector_store()
+    current_span().set(queries=len(query_vectors))
+    if hasattr(vector_store, "similarity_search_by_vectors_with_score"):
+        results = vector_store.similarity_search_by_vectors_with_score(query_vectors, k=k)
+        return [[doc for doc, _ in hits] for hits in results]
+    return map_in_threads(lambda vector: vector_search(vector, k), list(query_vectors), workers)
+
+
+def map_in_threads(func, items: list, workers: int) -> list:
+    """
+    Applies func to items on up to `workers` threads (0 = one per item) and returns the results in order.
+    Each call runs in a copy of the caller's context, so its spans nest under the caller's span.
+    """
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or len(items), len(items)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+@traced("retrieval.keyword")
+def keyword_search(query: str, k: int) -> list[Document]:
+    return [
+        Document(page_content=text, metadata=metadata, id=id_)
+        for id_, text, metadata, _ in get_index_manifest().keyword_search(query, k)
+    ]
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int = RETRIEVAL_RRF_K) -> list[Document]:
+    """
+    Merges rankings by summing 1 / (k + rank) per document; documents found by several
+    retrievers rise to the top without having to calibrate their scores against each other.
+    """
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            id_ = document_id(doc)
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(id_, doc)
+    return [docs[id_] for id_ in sorted(scores, key=scores.get, reverse=True)]
+
+
+def mmr(query_vector: np.ndarray, docs: list[Document], k: int, lambda_mult: float = RETRIEVAL_MMR_LAMBDA) -> list[Document]:
+    """
+    Reorders docs by maximal marginal relevance: each pick trades similarity to the query
+    against similarity to what was already picked. Chunk vectors come from the embedding cache.
+    """
+    if len(docs) <= 1:
+        return docs
+    vectors = get_embeddings().embed_array([doc.page_content for doc in docs])
+    relevance = vectors @ query_vector
+    selected, remaining = [], list(range(len(docs)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = (vectors[remaining] @ vectors[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = lambda_mult * relevance[remaining] - (1 - lambda_mult) * redundancy
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return [docs[i] for i in selected]
+
+
+def pack_context(docs: list[Document], max_tokens: int = RETRIEVAL_CONTEXT_TOKENS) -> tuple[list[Document], int]:
+    """
+    Greedily fills the token budget in rank order, skipping chunks that are duplicates or
+    near-duplicates of (or contained in) one already packed, and chunks that no longer fit.
+    Returns (packed_documents, tokens_used).
+    """
+    packed, hashes, used = [], [], 0
+    for doc in docs:
+        text = doc.page_content
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            continue
+        hash_ = simhash(text)
+        if any(hamming_distance(hash_, other) <= 3 for other in hashes):
+            continue
+        if any(text in other.page_content for other in packed):
+            continue
+        packed.append(doc)
+        hashes.append(hash_)
+        used += tokens
+    return packed, used
+
+
+@traced("rag.retrieve")
+def retrieve_batch(
+    queries: list[str],
+    sub_queries: list[list[str]] = None,
+    vector_k: int = RETRIEVAL_VECTOR_K,
+    keyword_k: int = RETRIEVAL_KEYWORD_K,
+    use_mmr: bool = RETRIEVAL_MMR_ENABLED,
+    max_tokens: int = RETRIEVAL_CONTEXT_TOKENS,
+    workers: int = RETRIEVAL_BATCH_WORKERS,
+    query_vectors: np.ndarray = None,
+) -> list[RetrievalResult]:
+    """
+    Hybrid retrieval for many queries at once: all query texts are embedded in one pass, vector
+    searches run as one batch and keyword searches run in parallel. Each query's rankings are fused
+    with reciprocal-rank fusion, optionally diversified with MMR, then packed into `max_tokens`.
+    `sub_queries[i]` (e.g. rephrasings from multi-query expansion) are searched alongside query i
+    and fused into its result. `query_vectors` are the queries' embeddings if the caller already has
+    them; then only sub-queries are embedded. Stage timings are for the whole batch. Returns results in query order.
+    """
+    if not queries:
+        return []
+    start = time.perf_counter()
+    timings = {}
+    groups = [[query] + list(sub_queries[n] if sub_queries else []) for n, query in enumerate(queries)]
+    texts = [text for group in groups for text in group]
+
+    if query_vectors is None:
+        query_vectors = get_embeddings().embed_array(texts)
+    elif len(texts) > len(queries):
+        # Reuse the given query vectors; embed only the sub-queries, in one pass
+        sub_vectors = iter(get_embeddings().embed_array([text for group in groups for text in group[1:]]))
+        query_vectors = np.vstack([
+            row for n, group in enumerate(groups) for row in [query_vectors[n]] + [next(sub_vectors) for _ in group[1:]]
+        ])
+    timings["embed"] = time.perf_counter() - start
+
+    stage = time.perf_counter()
+    vector_rankings = vector_search_batch(query_vectors, vector_k, workers)
+    timings["vector"] = time.perf_counter() - stage
+
+    keyword_rankings = [[] for _ in texts]
+    if keyword_k:
+        stage = time.perf_counter()
+        keyword_rankings = map_in_threads(lambda text: keyword_search(text, keyword_k), texts, workers)
+        timings["keyword"] = time.perf_counter() - stage
+
+    stage = time.perf_counter()
+    results, offset = [], 0
+    for group in groups:
+        rows = range(offset, offset + len(group))
+        rankings = [vector_rankings[n] for n in rows] + [keyword_rankings[n] for n in rows if keyword_k]
+        result = RetrievalResult(ranked=reciprocal_rank_fusion(rankings))
+        if use_mmr:
+            result.ranked = mmr(query_vectors[offset], result.ranked, len(result.ranked))
+        result.documents, result.context_tokens = pack_context(result.ranked, max_tokens)
+        results.append(result)
+        offset += len(group)
+    timings["rerank"] = time.perf_counter() - stage
+
+    timings["total"] = time.perf_counter() - start
+    for result in results:
+        result.timings = dict(timings)
+    current_span().set(
+        queries=len(queries), sub_queries=len(texts) - len(queries),
+        candidates=sum(len(result.ranked) for result in results),
+        chunks=sum(len(result.documents) for result in results),
+        context_tokens=sum(result.context_tokens for result in results),
+    )
+    logging.info(
+        f"Retrieved {sum(len(result.ranked) for result in results)} candidates for {len(queries)} queries "
+        f"({len(texts)} searched) in {timings['total'] * 1000:.0f} ms"
+    )
+    return results
+
+
+def retrieve(
+    query: str,
+    vector_k: int = RETRIEVAL_VECTOR_K,
+    keyword_k: int = RETRIEVAL_KEYWORD_K,
+    use_mmr: bool = RETRIEVAL_MMR_ENABLED,
+    max_tokens: int = RETRIEVAL_CONTEXT_TOKENS,
+) -> RetrievalResult:
+    """
+    Hybrid retrieval: vector search and BM25 keyword search (keyword_k=0 disables it) fused with
+    reciprocal-rank fusion, optionally diversified with MMR, then packed into `max_tokens`.
+    """
+    return retrieve_batch([query], vector_k=vector_k, keyword_k=keyword_k, use_mmr=use_mmr, max_tokens=max_tokens)[0]
+
+
+def evaluate(cases: list[dict], ks: tuple = (5, 10, 20), **retrieve_kwargs) -> dict:
+    """
+    Measures retrieval quality and latency on labelled queries, each {"query": ..., "relevant": [...]}
+    where relevant lists chunk IDs or source URLs. Returns mean recall@k over the fused ranking,
+    recall of the packed context, mean context tokens and p50/p95 latency in milliseconds.
+    """
+    recalls = {k: [] for k in ks}
+    packed_recall, tokens, latencies = [], [], []
+    for case in cases:
+        relevant = set(case["relevant"])
+        result = retrieve(case["query"], **retrieve_kwargs)
+        latencies.append(result.timings["total"] * 1000)
+        tokens.append(result.context_tokens)
+
+        def hits(docs):
+            found = {document_id(doc) for doc in docs} | {doc.metadata.get("source") for doc in docs}
+            return len(relevant & found) / len(relevant) if relevant else 0.0
+
+        for k in ks:
+            recalls[k].append(hits(result.ranked[:k]))
+        packed_recall.append(hits(result.documents))
+    return {
+        "queries": len(cases),
+        **{f"recall@{k}": float(np.mean(values)) if values else 0.0 for k, values in recalls.items()},
+        "context_recall": float(np.mean(packed_recall)) if packed_recall else 0.0,
+        "mean_context_tokens": float(np.mean(tokens)) if tokens else 0.0,
+        "latency_p50_ms": float(np.percentile(latencies, 50)) if latencies else 0.0,
+        "latency_p95_ms": float(np.percentile(latencies, 95)) if latencies else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python retrieval.py eval.jsonl [vector_k]
+    with open(sys.argv[1], "r", encoding="utf-8") as file:
+        eval_cases = [json.loads(line) for line in file if line.strip()]
+    k_override = {"vector_k": int(sys.argv[2])} if len(sys.argv) > 2 else {}
+    print(json.dumps(evaluate(eval_cases, **k_override), indent=2))
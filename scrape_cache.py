@@ -0,0 +1,214 @@
+# scrape_cache.py
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+from config import SCRAPE_CACHE_DIR, SCRAPE_CACHE_MAX_BYTES, SCRAPE_CACHE_ENABLED
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    content_hash: str
+    size: int
+    etag: str = None
+    last_modified: str = None
+    content_type: str = None
+    final_url: str = None
+
+
+def hash_file(path: str) -> str:
+    """
+    Returns the SHA-256 hex digest of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ScrapeCache:
+    """
+    Persistent, content-addressed cache for pages, assets and parse results.
+    Blobs are stored once per SHA-256 under `root/blobs`; a SQLite index maps keys
+    (e.g. "page:<url>") to blobs plus their HTTP validators. Least recently used
+    entries are evicted once the blobs exceed `max_bytes`.
+    """
+
+    def __init__(self, root: str = SCRAPE_CACHE_DIR, max_bytes: int = SCRAPE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, "index.db"), timeout=30, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, size INTEGER NOT NULL, "
+            "etag TEXT, last_modified TEXT, content_type TEXT, final_url TEXT, last_access REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, "blobs", content_hash[:2], content_hash)
+
+    def lookup(self, key: str) -> CacheEntry:
+        """
+        Returns the entry for key (marking it recently used), or None if it is not cached.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, content_hash, size, etag, last_modified, content_type, final_url "
+                "FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row and os.path.exists(self._blob_path(row[1])):
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+                return CacheEntry(*row)
+            return None
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def read_bytes(self, entry: CacheEntry) -> bytes:
+        with open(self._blob_path(entry.content_hash), 'rb') as file:
+            return file.read()
+
+    def copy_to(self, entry: CacheEntry, dest_path: str) -> None:
+        shutil.copyfile(self._blob_path(entry.content_hash), dest_path)
+
+    def put_file(self, key: str, path: str, **meta) -> CacheEntry:
+        """
+        Stores a copy of the file at path under key. meta may hold etag, last_modified,
+        content_type and final_url. Returns the new entry.
+        """
+        content_hash = hash_file(path)
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+            os.close(fd)
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, blob_path)
+        return self._index(key, content_hash, os.path.getsize(blob_path), meta)
+
+    def put_bytes(self, key: str, data: bytes, **meta) -> CacheEntry:
+        """
+        Stores data under key. Returns the new entry.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path))
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, blob_path)
+        return self._index(key, content_hash, len(data), meta)
+
+    def _index(self, key: str, content_hash: str, size: int, meta: dict) -> CacheEntry:
+        entry = CacheEntry(key, content_hash, size, meta.get("etag"), meta.get("last_modified"),
+                           meta.get("content_type"), meta.get("final_url"))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, content_hash, size, entry.etag, entry.last_modified, entry.content_type,
+                 entry.final_url, time.time())
+            )
+            self._db.commit()
+        self.evict()
+        return entry
+
+    def evict(self) -> None:
+        """
+        Drops least recently used entries until the stored blobs fit in max_bytes.
+        A blob is deleted once no remaining entry references it.
+        """
+        with self._lock:
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM entries)"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute("SELECT key, content_hash, size FROM entries ORDER BY last_access").fetchall()
+            for key, content_hash, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.evictions += 1
+                still_used = self._db.execute(
+                    "SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1", (content_hash,)
+                ).fetchone()
+                if not still_used:
+                    total -= size
+                    try:
+                        os.remove(self._blob_path(content_hash))
+                    except OSError:
+                        pass
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, stored = self._db.execute(
+                "SELECT COUNT(*), (SELECT COALESCE(SUM(size), 0) FROM "
+                "(SELECT DISTINCT content_hash, size FROM entries)) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": stored,
+        }
+
+
+def conditional_headers(entry: CacheEntry) -> dict:
+    """
+    Returns the If-None-Match / If-Modified-Since headers for revalidating a cached entry.
+    """
+    headers = {}
+    if entry and entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry and entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def validators(response) -> dict:
+    """
+    Extracts the ETag / Last-Modified validators from an HTTP response.
+    """
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scrape_cache() -> ScrapeCache:
+    """
+    Returns the process-wide scrape cache, or None if caching is disabled.
+    """
+    global _cache
+    if not SCRAPE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ScrapeCache()
+        return _cache
@@ -1,80 +1,123 @@
 # scraper.py
+import io
 import os
-import time
 import logging
+import hashlib
 import requests
+from collections import deque
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 from PyPDF2 import PdfMerger
 from PIL import Image
 from reportlab.pdfgen import canvas
+from browser_pool import get_browser_pool, wait_for_page_ready
+from config import DOWNLOAD_TIMEOUT, PDF_IMAGE_DPI, PDF_IMAGE_QUALITY, PDF_ASSEMBLY_WORKERS, PDF_PART_MAX_BYTES
+from downloader import download_assets, get_session, IMAGE_TYPES, PDF_TYPES
+from scrape_cache import get_scrape_cache, conditional_headers, validators
+from html_to_markdown import html_to_markdown
+from telemetry import span, traced, current_span
 
+LINKS_FILE = "page_links.txt"  # Outgoing links of a scraped page, one per line
+PAGE_MARKDOWN_FILE = "page_content.md"  # Page converted locally to Markdown
+COMBINED_PDF_PREFIX = "combined_output"  # Assembled asset PDFs (and their parts) start with this
+FALLBACK_PDF_SUFFIX = "_fallback_pages.pdf"  # Page subsets pdf_extractor sends to LlamaParse
+IMAGE_PAGE_INCHES = 11  # Images are downsampled to fit a page this long at PDF_IMAGE_DPI
+
+def _revalidate_page(cache, url: str):
+    """
+    Sends a conditional HEAD for a page. Returns (cached_entry_if_unmodified, fresh_validators).
+    """
+    entry = cache.lookup(f"page:{url}")
+    try:
+        response = get_session().head(
+            url, headers=conditional_headers(entry), allow_redirects=True, timeout=DOWNLOAD_TIMEOUT
+        )
+    except requests.RequestException as e:
+        logging.info(f"Could not revalidate {url}: {e}")
+        return None, {}
+    if entry and response.status_code == 304:
+        return entry, {}
+    return None, validators(response) if response.ok else {}
+
+@traced("scrape.navigate")
 def navigate_to_url(url: str) -> tuple[str, str]:
     """
-    Uses Selenium in headless mode to obtain the page source and final URL.
+    Uses a pooled headless Selenium session to obtain the page source and final URL.
+    Pages that revalidate as unchanged (ETag / Last-Modified) are served from the scrape cache.
     Returns (page_source, final_url) or (None, None) on failure.
     """
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--disable-gpu")
-    driver = None
+    cache = get_scrape_cache()
+    page_validators = {}
+    if cache:
+        entry, page_validators = _revalidate_page(cache, url)
+        cache.record(hit=entry is not None)
+        if entry:
+            logging.info(f"Page not modified, using cached copy: {url}")
+            current_span().set(cached=True)
+            return cache.read_bytes(entry).decode("utf-8"), entry.final_url
     try:
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()),
-            options=options
-        )
-        driver.get(url)
-        time.sleep(3)  # Allow time for the page to load
-        page_source = driver.page_source
-        final_url = driver.current_url
-        return page_source, final_url
+        with get_browser_pool().driver() as driver:
+            driver.get(url)
+            wait_for_page_ready(driver)  # Wait for the load event or network idle
+            page_source = driver.page_source
+            final_url = driver.current_url
     except Exception as e:
         logging.error(f"Error navigating to {url}: {e}")
         return None, None
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+    if cache and (page_validators.get("etag") or page_validators.get("last_modified")):
+        try:
+            cache.put_bytes(f"page:{url}", page_source.encode("utf-8"), final_url=final_url, **page_validators)
+        except Exception as e:
+            logging.warning(f"Could not cache page {url}: {e}")
+    return page_source, final_url
 
-def download_file(url: str, save_path: str) -> bool:
+def extract_links(soup: BeautifulSoup, base_url: str) -> list[str]:
     """
-    Downloads a file from a URL to the specified path.
-    Returns True if successful, otherwise False.
+    Returns the absolute http(s) URLs of all anchors on the page, without fragments, in page order.
     """
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        response = requests.get(url, stream=True, headers=headers, timeout=30)
-        response.raise_for_status()
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-        logging.info(f"Downloaded: {save_path}")
-        return True
-    except requests.RequestException as e:
-        logging.error(f"Failed to download {url}: {e}")
-        return False
+    links = []
+    seen = set()
+    for link in soup.find_all('a', href=True):
+        href = urljoin(base_url, link['href']).split('#', 1)[0]
+        if urlparse(href).scheme in ("http", "https") and href not in seen:
+            seen.add(href)
+            links.append(href)
+    return links
+
+def read_links(dir_name: str) -> list[str]:
+    """
+    Returns the links saved by scrape_page for the page in dir_name (empty if none).
+    """
+    links_file = os.path.join(dir_name, LINKS_FILE)
+    if not os.path.exists(links_file):
+        return []
+    with open(links_file, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
 
-def scrape_page(url: str, scrape_images: bool = True, scrape_pdfs: bool = True) -> str:
+@traced("scrape.page")
+def scrape_page(url: str, scrape_images: bool = True, scrape_pdfs: bool = True, run_id: str = None) -> str:
     """
-    Scrapes a webpage, saving text, and conditionally images and PDFs.
+    Scrapes a webpage, saving text, and conditionally images and PDFs. `run_id` (e.g. the job)
+    is part of the directory name, so runs scraping the same URL never share a directory.
     Returns the directory name where the content is saved or None if failed.
     """
     html_content, final_url = navigate_to_url(url)
     if not html_content or not final_url:
         logging.error(f"Failed to retrieve content from {url}")
         return None
-    soup = BeautifulSoup(html_content, "html.parser")
+    current_span().set(html_bytes=len(html_content.encode("utf-8")))
+    with span("scrape.parse_html"):
+        soup = BeautifulSoup(html_content, "html.parser")
     text_content = soup.get_text(separator='\n', strip=True)
     
-    # Create a directory based on the domain
-    domain = urlparse(final_url).netloc.replace('.', '_')
+    # Create a directory per page and run (under one per domain) so concurrent scrapes don't collide
+    page_dir = hashlib.sha1(final_url.encode("utf-8")).hexdigest()[:12]
+    domain = os.path.join(
+        urlparse(final_url).netloc.replace('.', '_'),
+        f"{run_id}_{page_dir}" if run_id else page_dir
+    )
     os.makedirs(domain, exist_ok=True)
     
     # Save text content
@@ -84,92 +127,201 @@ def scrape_page(url: str, scrape_images: bool = True, scrape_pdfs: bool = True)
             file.write(text_content)
     except Exception as e:
         logging.error(f"Error saving text content to {text_file}: {e}")
+
+    # Save structured Markdown of the main content (headings, lists, tables; no boilerplate)
+    markdown_file = os.path.join(domain, PAGE_MARKDOWN_FILE)
+    try:
+        with span("scrape.html_to_markdown"):
+            markdown = html_to_markdown(soup)
+        with open(markdown_file, 'w', encoding='utf-8') as file:
+            file.write(markdown)
+    except Exception as e:
+        logging.error(f"Error saving Markdown content to {markdown_file}: {e}")
+
+    # Save outgoing links so a crawler can follow them
+    links_file = os.path.join(domain, LINKS_FILE)
+    try:
+        with open(links_file, 'w', encoding='utf-8') as file:
+            file.write("\n".join(extract_links(soup, final_url)))
+    except Exception as e:
+        logging.error(f"Error saving links to {links_file}: {e}")
     
-    # Download images if enabled
+    # Collect assets; their real type is sniffed from the response, not the URL extension
+    assets = []
     if scrape_images:
         for img_tag in soup.find_all('img'):
             src = img_tag.get('src')
-            if src:
-                img_url = urljoin(final_url, src)
-                if img_url.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    img_name = os.path.basename(urlparse(img_url).path) or f"image_{os.urandom(4).hex()}.jpg"
-                    img_save_path = os.path.join(domain, img_name)
-                    download_file(img_url, img_save_path)
-    
-    # Download PDFs if enabled
+            if src and not src.startswith('data:'):
+                assets.append((urljoin(final_url, src), IMAGE_TYPES))
     if scrape_pdfs:
         for link in soup.find_all('a', href=True):
             file_url = urljoin(final_url, link['href'])
-            if file_url.lower().endswith('.pdf'):
-                pdf_name = os.path.basename(urlparse(file_url).path) or f"file_{os.urandom(4).hex()}.pdf"
-                pdf_save_path = os.path.join(domain, pdf_name)
-                download_file(pdf_url := file_url, pdf_save_path)
+            if urlparse(file_url).path.lower().endswith('.pdf') or 'pdf' in link.get('type', '').lower():
+                assets.append((file_url, PDF_TYPES))
+    with span("scrape.download_assets", assets=len(assets)) as download_span:
+        saved = download_assets(assets, domain)
+        download_span.set(saved=len(saved), bytes=sum(os.path.getsize(path) for path in saved if os.path.exists(path)))
     
     return domain
 
-def combine_text_images_pdfs(dir_name: str, output_pdf_path: str) -> str:
+def list_assets(dir_name: str) -> tuple[list[str], list[str]]:
     """
-    Combines text (converted to PDF), images (converted to PDF), and existing PDFs into one PDF.
-    Returns the path to the combined PDF.
+    Returns (image_paths, pdf_paths) of the assets scrape_page downloaded into dir_name,
+    leaving out PDFs assembled or split from them (combined output, LlamaParse fallback pages).
     """
-    merger = PdfMerger()
-    temp_pdfs = []
-    
-    # Convert text to PDF
+    images, pdfs = [], []
+    for file in sorted(os.listdir(dir_name)):
+        path = os.path.join(dir_name, file)
+        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+            images.append(path)
+        elif (file.lower().endswith('.pdf') and not file.startswith(COMBINED_PDF_PREFIX)
+              and not file.endswith(FALLBACK_PDF_SUFFIX)):
+            pdfs.append(path)
+    return images, pdfs
+
+def text_to_pdf_bytes(text_file: str) -> bytes:
+    """
+    Renders a text file line by line onto PDF pages. Returns the PDF bytes (reproducible for the same text).
+    """
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, invariant=1)  # Reproducible bytes keep the parse cache effective
+    with open(text_file, 'r', encoding='utf-8') as tf:
+        y = 800
+        for line in tf:
+            if y < 50:
+                c.showPage()
+                y = 800
+            c.drawString(50, y, line.strip())
+            y -= 15
+    c.save()
+    return buffer.getvalue()
+
+def image_to_pdf_bytes(image_path: str, dpi: int = PDF_IMAGE_DPI, quality: int = PDF_IMAGE_QUALITY) -> bytes:
+    """
+    Converts an image to a one-page JPEG-compressed PDF. With dpi > 0 the image is downsampled so its
+    longer side fits a page of IMAGE_PAGE_INCHES at that resolution; JPEGs are then decoded at reduced
+    scale, so large photos are never held in memory at full size.
+    Returns the PDF bytes.
+    """
+    with Image.open(image_path) as image:
+        if dpi:
+            max_side = int(IMAGE_PAGE_INCHES * dpi)
+            image.draft("RGB", (max_side, max_side))  # No-op for formats other than JPEG
+            image = image.convert("RGB")
+            image.thumbnail((max_side, max_side))
+        else:
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PDF", resolution=dpi or 72, quality=quality)
+    return buffer.getvalue()
+
+def _ordered_map(func, items: list, workers: int) -> Iterator[tuple]:
+    """
+    Runs func over items in a thread pool and yields (item, future) in input order, with at most
+    2 * workers results held at a time so memory does not grow with the number of items.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        for item in items:
+            pending.append((item, pool.submit(func, item)))
+            if len(pending) >= 2 * max(1, workers):
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+class _PartWriter:
+    """
+    Appends PDFs to the current output part and writes the part to disk once the next input would
+    push it over max_bytes (0 = one part), so only one part's inputs are held at a time.
+    """
+
+    def __init__(self, output_pdf_path: str, max_bytes: int):
+        self.output_pdf_path = output_pdf_path
+        self.max_bytes = max_bytes
+        self.parts = []
+        self.merger, self.size, self.inputs = PdfMerger(), 0, 0
+
+    def add(self, pdf, size: int) -> None:
+        if self.max_bytes and self.inputs and self.size + size > self.max_bytes:
+            self.flush()
+        self.merger.append(pdf)
+        self.size += size
+        self.inputs += 1
+
+    def flush(self) -> None:
+        if not self.inputs:
+            return
+        stem = os.path.splitext(self.output_pdf_path)[0]
+        part_path = f"{stem}_part{len(self.parts) + 1}.pdf"
+        self.merger.write(part_path)
+        self.merger.close()
+        self.parts.append(part_path)
+        self.merger, self.size, self.inputs = PdfMerger(), 0, 0
+
+    def close(self) -> list[str]:
+        self.flush()
+        if len(self.parts) == 1:
+            os.replace(self.parts[0], self.output_pdf_path)
+            self.parts = [self.output_pdf_path]
+        return self.parts
+
+@traced("assets.combine_pdf")
+def combine_text_images_pdf_parts(
+    dir_name: str,
+    output_pdf_path: str,
+    include_text: bool = True,
+    include_pdfs: bool = True,
+    max_part_bytes: int = PDF_PART_MAX_BYTES,
+    workers: int = PDF_ASSEMBLY_WORKERS,
+) -> list[str]:
+    """
+    Streams text (converted to PDF), images (downsampled and converted to PDF in a thread pool) and
+    existing PDFs into output PDFs of at most `max_part_bytes` each (0 = a single file), written as
+    they fill up. Nothing is written to disk per image and memory stays flat however many assets
+    the page has. With include_text=False only the images and PDFs are combined (the page text is
+    indexed separately from its local Markdown); include_pdfs=False leaves out the PDFs
+    (they are extracted locally).
+    Returns the paths of the written parts in order: `output_pdf_path` itself when everything fits
+    in one part, otherwise `<name>_part1.pdf`, `<name>_part2.pdf`, ...
+    """
+    writer = _PartWriter(output_pdf_path, max_part_bytes)
+    images, pdfs = list_assets(dir_name)
+
     text_file = os.path.join(dir_name, "page_content.txt")
-    if os.path.exists(text_file):
-        temp_text_pdf = os.path.join(dir_name, "text_content.pdf")
+    if include_text and os.path.exists(text_file):
         try:
-            c = canvas.Canvas(temp_text_pdf)
-            with open(text_file, 'r', encoding='utf-8') as tf:
-                lines = tf.readlines()
-                y = 800
-                for line in lines:
-                    if y < 50:
-                        c.showPage()
-                        y = 800
-                    c.drawString(50, y, line.strip())
-                    y -= 15
-            c.save()
-            merger.append(temp_text_pdf)
-            temp_pdfs.append(temp_text_pdf)
+            text_pdf = text_to_pdf_bytes(text_file)
+            writer.add(io.BytesIO(text_pdf), len(text_pdf))
         except Exception as e:
             logging.error(f"Error converting text to PDF for {text_file}: {e}")
-    
-    # Convert images to PDFs
-    for file in os.listdir(dir_name):
-        if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-            image_path = os.path.join(dir_name, file)
-            image_pdf = os.path.join(dir_name, f"{os.path.splitext(file)[0]}.pdf")
-            try:
-                Image.open(image_path).convert("RGB").save(image_pdf)
-                merger.append(image_pdf)
-                temp_pdfs.append(image_pdf)
-            except Exception as e:
-                logging.error(f"Error processing image {image_path}: {e}")
-    
-    # Append existing PDFs (skip temporary ones and the output file)
-    for file in os.listdir(dir_name):
-        if file.lower().endswith('.pdf'):
-            pdf_path = os.path.join(dir_name, file)
-            if pdf_path not in temp_pdfs and os.path.basename(pdf_path) != os.path.basename(output_pdf_path):
-                try:
-                    merger.append(pdf_path)
-                except Exception as e:
-                    logging.error(f"Error appending PDF {pdf_path}: {e}")
-    
+
+    for image_path, future in _ordered_map(image_to_pdf_bytes, images, workers):
+        try:
+            image_pdf = future.result()
+            writer.add(io.BytesIO(image_pdf), len(image_pdf))
+        except Exception as e:
+            logging.error(f"Error processing image {image_path}: {e}")
+
+    for pdf_path in pdfs if include_pdfs else []:
+        try:
+            writer.add(pdf_path, os.path.getsize(pdf_path))
+        except Exception as e:
+            logging.error(f"Error appending PDF {pdf_path}: {e}")
+
     try:
-        merger.write(output_pdf_path)
-        merger.close()
+        parts = writer.close()
     except Exception as e:
         logging.error(f"Error writing combined PDF to {output_pdf_path}: {e}")
-    
-    # Clean up temporary PDF files
-    for temp_pdf in temp_pdfs:
-        try:
-            if os.path.exists(temp_pdf):
-                os.remove(temp_pdf)
-        except Exception as e:
-            logging.warning(f"Failed to remove temporary file {temp_pdf}: {e}")
-    
-    return output_pdf_path
+        return []
+    current_span().set(images=len(images), parts=len(parts), bytes=sum(os.path.getsize(part) for part in parts))
+    return parts
+
+def combine_text_images_pdfs(dir_name: str, output_pdf_path: str, include_text: bool = True, include_pdfs: bool = True) -> str:
+    """
+    Combines text (converted to PDF), images (converted to PDF), and existing PDFs into one PDF.
+    Legacy single-file path, kept for compatibility: the whole output is one PDF however many assets
+    the page has, so its size and memory are unbounded. The pipeline uses combine_text_images_pdf_parts.
+    Returns the path to the combined PDF, or None if there was nothing to combine.
+    """
+    parts = combine_text_images_pdf_parts(dir_name, output_pdf_path, include_text, include_pdfs, max_part_bytes=0)
+    return parts[0] if parts else None
@@ -0,0 +1,363 @@
+# telemetry.py
+import os
+import json
+import time
+import uuid
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import TELEMETRY_ENABLED, TRACE_FILE, TRACE_MAX_BYTES
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BREAKDOWN_MAX_RUNS = 500  # Runs whose step breakdowns are kept in memory per process
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed pipeline step. Attributes hold counts and sizes (e.g. bytes, chunks, pages);
+    numeric ones are summed into metrics, the rest are kept in the trace only.
+    """
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = _trace_id.get() or (parent.trace_id if parent else uuid.uuid4().hex[:16])
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, **counts) -> None:
+        for key, value in counts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def record(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attrs": self.attrs,
+            "error": self.error,
+            "pid": os.getpid(),
+        }
+
+
+def _export(record: dict) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        try:
+            directory = os.path.dirname(TRACE_FILE)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(TRACE_FILE) and os.path.getsize(TRACE_FILE) > TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, f"{TRACE_FILE}.1")  # Keep one rotated file
+            # One write per span in append mode, so lines from several processes don't interleave
+            with open(TRACE_FILE, "a", encoding="utf-8") as file:
+                file.write(line)
+        except OSError as e:
+            logging.warning(f"Could not write trace span: {e}")
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times a block as a span nested under the current one and appends it to the trace file.
+    Usage: `with span("scrape.download", url=url) as s: ...; s.add(bytes=n)`.
+    """
+    current = Span(name, attrs)
+    if not TELEMETRY_ENABLED:
+        yield current
+        return
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _export(current.record())
+
+
+def current_span() -> Span:
+    """
+    Returns the active span, so code deep in a step can attach counts to it. Outside any span
+    (or with telemetry off) a detached span is returned and whatever is set on it is dropped.
+    """
+    return _current_span.get() or Span("detached", {})
+
+
+def traced(name: str):
+    """
+    Decorator that runs every call of a function (sync or async) inside span(name).
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace(trace_id: str):
+    """
+    Groups every span in the block under one run ID (e.g. "job-12" or an answer's ID),
+    so a run's timing breakdown can be looked up across processes.
+    """
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def new_trace_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+
+def read_spans(trace_id: str = None) -> list[dict]:
+    """
+    Returns the spans in the trace file (all of them, or those of one run), oldest first.
+    """
+    spans = []
+    for path in (f"{TRACE_FILE}.1", TRACE_FILE):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if trace_id and f'"{trace_id}"' not in line:
+                        continue  # Cheap pre-filter before parsing
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written line
+                    if trace_id is None or record.get("trace_id") == trace_id:
+                        spans.append(record)
+        except FileNotFoundError:
+            continue
+    return spans
+
+
+class _TraceTail:
+    """
+    Follows the trace file across rotations, returning only the records appended since the last call.
+    """
+
+    def __init__(self):
+        self._offset = 0
+        self._inode = None
+
+    def _read(self, path: str, records: list) -> None:
+        with open(path, "r", encoding="utf-8") as file:
+            file.seek(self._offset)
+            while True:
+                line = file.readline()
+                if not line.endswith("\n"):
+                    break  # Incomplete last line; read it next time
+                self._offset = file.tell()
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+
+    def records(self) -> list[dict]:
+        try:
+            stat = os.stat(TRACE_FILE)
+        except FileNotFoundError:
+            return []
+        records = []
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            try:
+                if self._inode is not None and os.stat(f"{TRACE_FILE}.1").st_ino == self._inode:
+                    self._read(f"{TRACE_FILE}.1", records)  # The rest of the file that was rotated away
+            except FileNotFoundError:
+                pass
+            self._inode, self._offset = stat.st_ino, 0
+        self._read(TRACE_FILE, records)
+        return records
+
+
+class _RunBreakdowns:
+    """
+    Per-run step summaries for run_breakdown, folded incrementally from the trace file, so a UI
+    that refreshes every few seconds reads only new lines. The rotated file is read once, on first
+    use; the most recent `max_runs` runs are kept.
+    """
+
+    def __init__(self, max_runs: int = BREAKDOWN_MAX_RUNS):
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._tail = None
+        self._runs = OrderedDict()  # trace_id -> {step: row}
+
+    def _fold(self, record: dict) -> None:
+        trace_id = record.get("trace_id")
+        if not trace_id or "name" not in record:
+            return
+        rows = self._runs.setdefault(trace_id, {})
+        self._runs.move_to_end(trace_id)
+        while len(self._runs) > self.max_runs:
+            self._runs.popitem(last=False)
+        row = rows.setdefault(record["name"], {"step": record["name"], "count": 0, "total_s": 0.0, "max_s": 0.0})
+        row["count"] += 1
+        row["total_s"] += record.get("duration") or 0.0
+        row["max_s"] = max(row["max_s"], record.get("duration") or 0.0)
+        for key, value in record.get("attrs", {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                row[key] = row.get(key, 0) + value
+
+    def get(self, trace_id: str) -> list[dict]:
+        with self._lock:
+            if self._tail is None:
+                self._tail = _TraceTail()
+                try:
+                    with open(f"{TRACE_FILE}.1", "r", encoding="utf-8") as file:
+                        for line in file:
+                            try:
+                                self._fold(json.loads(line))
+                            except ValueError:
+                                continue
+                except FileNotFoundError:
+                    pass
+            for record in self._tail.records():
+                self._fold(record)
+            rows = [dict(row) for row in self._runs.get(trace_id, {}).values()]
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+
+_breakdowns = _RunBreakdowns()
+
+
+def run_breakdown(trace_id: str) -> list[dict]:
+    """
+    Summarizes a run's spans per step: count, total and max seconds, and summed numeric attributes.
+    Returns rows sorted by total time, slowest first.
+    """
+    return _breakdowns.get(trace_id)
+
+
+class _MetricsAggregator:
+    """
+    Folds spans from the trace file (written by every process) into Prometheus metrics,
+    reading only the lines appended since the previous scrape.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tail = _TraceTail()
+        self.counts = {}  # span -> count
+        self.errors = {}  # span -> error count
+        self.sums = {}  # span -> total seconds
+        self.buckets = {}  # span -> per-bucket counts
+        self.attr_totals = {}  # (span, attribute) -> sum
+
+    def _fold(self, record: dict) -> None:
+        name, duration = record["name"], record["duration"] or 0.0
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.sums[name] = self.sums.get(name, 0.0) + duration
+        if record.get("error"):
+            self.errors[name] = self.errors.get(name, 0) + 1
+        buckets = self.buckets.setdefault(name, [0] * len(DURATION_BUCKETS))
+        for n, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                buckets[n] += 1
+        for key, value in record["attrs"].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.attr_totals[(name, key)] = self.attr_totals.get((name, key), 0) + value
+
+    def refresh(self) -> None:
+        for record in self._tail.records():
+            try:
+                self._fold(record)
+            except KeyError:
+                continue
+
+    def render(self) -> str:
+        with self._lock:
+            self.refresh()
+            lines = [
+                "# HELP pipeline_span_duration_seconds Duration of pipeline steps.",
+                "# TYPE pipeline_span_duration_seconds histogram",
+            ]
+            for name in sorted(self.counts):
+                for bound, count in zip(DURATION_BUCKETS, self.buckets[name]):
+                    lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {self.counts[name]}')
+                lines.append(f'pipeline_span_duration_seconds_sum{{span="{name}"}} {self.sums[name]}')
+                lines.append(f'pipeline_span_duration_seconds_count{{span="{name}"}} {self.counts[name]}')
+            lines += ["# HELP pipeline_span_errors_total Pipeline steps that raised.", "# TYPE pipeline_span_errors_total counter"]
+            lines += [f'pipeline_span_errors_total{{span="{name}"}} {n}' for name, n in sorted(self.errors.items())]
+            lines += [
+                "# HELP pipeline_span_attribute_total Summed span attributes (bytes, pages, chunks, ...).",
+                "# TYPE pipeline_span_attribute_total counter",
+            ]
+            lines += [
+                f'pipeline_span_attribute_total{{span="{name}",attribute="{key}"}} {value}'
+                for (name, key), value in sorted(self.attr_totals.items())
+            ]
+            return "\n".join(lines) + "\n"
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    Serves Prometheus metrics for every process's spans at http://<host>:<port>/metrics,
+    from a daemon thread. Only the first call per process starts a server.
+    """
+    global _metrics_server
+    if _metrics_server is not None or not port:
+        return
+    aggregator = _MetricsAggregator()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = aggregator.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the application log
+
+    try:
+        _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError as e:
+        logging.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Serving metrics at http://localhost:{port}/metrics")
@@ -1,26 +1,70 @@
+import time
 import logging
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
-from langchain_groq import ChatGroq
+import threading
+from embedding_service import EmbeddingService, EmbeddingCache
+from telemetry import span, traced, current_span
 from langchain.prompts import PromptTemplate
-from config import GROQ_API_KEY, PINECONE_API_KEY, INDEX_NAME
+from config import (
+    PINECONE_API_KEY,
+    INDEX_NAME,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_DIR,
+    EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_ENABLED,
+    GROQ_BASE_URL,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-try:
-    # Initialize embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="BAAI/bge-small-en-v1.5",
-        encode_kwargs={"normalize_embeddings": True}
-    )
-    logging.info("Embeddings initialized successfully.")
-except Exception as e:
-    logging.exception("Error initializing embeddings.")
-    raise e
+# Services are created on first use (or by warm_up) and then shared for the life of the process,
+# which spans Streamlit reruns, so neither imports nor reruns pay for model loads or network calls.
+_instances = {}
+_init_seconds = {}
+_init_errors = {}
+_locks = {name: threading.Lock() for name in ("embeddings", "vector_store", "llm", "sequence")}
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def _get(name: str, factory):
+    if name in _instances:
+        return _instances[name]
+    with _locks[name]:
+        if name not in _instances:
+            start = time.perf_counter()
+            try:
+                with span(f"init.{name}"):
+                    _instances[name] = factory()
+            except Exception as e:
+                _init_errors[name] = str(e)
+                logging.exception(f"Error initializing {name}.")
+                raise
+            _init_seconds[name] = time.perf_counter() - start
+            _init_errors.pop(name, None)
+    return _instances[name]
+
+
+def _create_embeddings() -> EmbeddingService:
+    # Batched, cached; shared by ingestion and queries. The model itself loads on first use.
+    embeddings = EmbeddingService(cache=EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None)
+    logging.info(f"Embeddings initialized successfully ({EMBEDDING_MODEL}, backend={EMBEDDING_BACKEND}).")
+    return embeddings
+
+
+def _create_vector_store():
+    if VECTOR_BACKEND == "local":
+        from local_vector_store import LocalVectorStore
+
+        # In-process index persisted on disk; no network round trip per query
+        vector_store = LocalVectorStore(embedding=get_embeddings())
+        logging.info(f"Using local vector index at: {LOCAL_INDEX_DIR}")
+        return vector_store
+
+    from langchain_pinecone import PineconeVectorStore
+    from pinecone import Pinecone, ServerlessSpec
 
-try:
     # Initialize Pinecone client with environment
     pc = Pinecone(api_key=PINECONE_API_KEY, environment="us-east-1")
 
@@ -37,21 +81,18 @@ try:
         )
 
     # Load the index
-    index = pc.Index(INDEX_NAME)
-    vector_store = PineconeVectorStore(embedding=embeddings, index=index)
+    vector_store = PineconeVectorStore(embedding=get_embeddings(), index=pc.Index(INDEX_NAME))
     logging.info(f"Connected to Pinecone index: {INDEX_NAME}")
+    return vector_store
 
-except Exception as e:
-    logging.exception("Error initializing Pinecone or vector store.")
-    raise e
 
-try:
-    # Initialize LLM (ChatGroq)
-    llm = ChatGroq(model="llama-3.3-70b-versatile")
+def _create_llm():
+    from langchain_groq import ChatGroq
+
+    llm = ChatGroq(model="llama-3.3-70b-versatile", base_url=GROQ_BASE_URL)
     logging.info("ChatGroq LLM initialized successfully.")
-except Exception as e:
-    logging.exception("Error initializing ChatGroq LLM.")
-    raise e
+    return llm
+
 
 # Set up a prompt template and combine it with the LLM
 prompt_template = PromptTemplate(
@@ -65,8 +106,136 @@ prompt_template = PromptTemplate(
     )
 )
 
-# Combine prompt with LLM
-sequence = prompt_template | llm
+
+def get_embeddings() -> EmbeddingService:
+    return _get("embeddings", _create_embeddings)
+
+
+def get_vector_store():
+    """
+    Returns the Pinecone vector store, or the local one when VECTOR_BACKEND=local.
+    """
+    return _get("vector_store", _create_vector_store)
+
+
+def get_llm():
+    return _get("llm", _create_llm)
+
+
+def get_sequence():
+    """
+    Returns the prompt combined with the LLM.
+    """
+    return _get("sequence", lambda: prompt_template | get_llm())
+
+
+def warm_up() -> None:
+    """
+    Starts loading the embedding model, connecting the vector store and creating the LLM client
+    concurrently in background threads, once per process. Returns immediately; callers that need
+    a component before it is ready simply wait for it.
+    """
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+
+    def _load_embedding_model() -> None:
+        with span("init.embedding_model"):
+            get_embeddings().load()
+
+    def run(name: str, task) -> None:
+        start = time.perf_counter()
+        try:
+            task()
+        except Exception as e:
+            _init_errors.setdefault(name, str(e))
+            return
+        logging.info(f"Warm-up of {name} finished in {time.perf_counter() - start:.2f}s.")
+
+    tasks = {
+        "embedding model": _load_embedding_model,
+        "vector store": get_vector_store,
+        "llm": get_sequence,
+    }
+    for name, task in tasks.items():
+        threading.Thread(target=run, args=(name, task), name=f"warm-up-{name}", daemon=True).start()
+
+
+def init_status() -> dict:
+    """
+    Returns {component: {"ready": bool, "seconds": float or None, "error": str or None}}.
+    """
+    embeddings = _instances.get("embeddings")
+    status = {
+        name: {"ready": name in _instances, "seconds": _init_seconds.get(name), "error": _init_errors.get(name)}
+        for name in ("embeddings", "vector_store", "llm")
+    }
+    status["embedding_model"] = {
+        "ready": embeddings is not None and embeddings.load_seconds is not None,
+        "seconds": embeddings.load_seconds if embeddings is not None else None,
+        "error": _init_errors.get("embedding model"),
+    }
+    return status
+
+
+@traced("vector_store.upsert")
+def upsert_vectors(texts: list[str], vectors, metadatas: list[dict], ids: list[str], namespace: str = "") -> None:
+    """
+    Writes precomputed embeddings to the configured vector store, so callers can embed
+    one batch while the previous one is being upserted. Pinecone writes go through the index writer
+    (byte-sized batches, concurrent requests, retries).
+    """
+    current_span().set(vectors=len(texts))
+    if VECTOR_BACKEND == "local":
+        get_vector_store().add_embeddings(texts, vectors, metadatas, ids, namespace=namespace)
+        return
+    from index_writer import get_index_writer
+
+    get_index_writer().upsert(texts, vectors, metadatas, ids, namespace)
+
+
+def delete_vectors(ids: list[str] = None, namespace: str = "") -> None:
+    """
+    Deletes vectors by ID from a namespace, or the whole namespace when ids is None.
+    """
+    if VECTOR_BACKEND == "local":
+        if ids is None:
+            get_vector_store().delete(delete_all=True, namespace=namespace)
+        elif ids:
+            get_vector_store().delete(ids=ids, namespace=namespace)
+        return
+    from index_writer import get_index_writer
+
+    if ids is None:
+        get_index_writer().delete_namespace(namespace)
+    elif ids:
+        get_index_writer().delete(ids, namespace)
+
+
+def delete_all_vectors() -> None:
+    """
+    Deletes every vector in every namespace.
+    """
+    if VECTOR_BACKEND == "local":
+        get_vector_store().delete(delete_all=True)
+        return
+    from index_writer import get_index_writer
+
+    get_index_writer().delete_all()
+
+
+def __getattr__(name: str):
+    # Backwards compatibility for `vector_store_setup.vector_store` and friends (resolved lazily)
+    getters = {"vector_store": get_vector_store, "embeddings": get_embeddings, "llm": get_llm, "sequence": get_sequence}
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Expose variables for other modules
-__all__ = ["vector_store", "llm", "sequence"]
+__all__ = [
+    "get_vector_store", "get_embeddings", "get_llm", "get_sequence", "warm_up", "init_status", "upsert_vectors",
+    "delete_vectors", "delete_all_vectors",
+]